@@ -6,47 +6,37 @@ import os
 import random
 import struct
 import time
-from typing import List
+from typing import List, Tuple
 
 from ilnpsocket.underlay.routing.ilnp import ILNPPacket, is_control_packet
 
+# Record of sent or forwarded packet for analysis, kept as the row it is saved as rather than an object per packet:
+# (id of node being recorded, epoch time packet was sent, type of packet (control or data), was packet forwarded)
+PacketEntry = Tuple[int, float, str, bool]
 
-class PacketEntry:
-    def __init__(self, my_id, sent_at_time, packet_type, forwarded):
-        """
-        Record of sent or forwarded packet for analysis
-        :param my_id id of node being recorded
-        :type my_id int
-        :param sent_at_time: epoch time packet was sent
-        :type sent_at_time float
-        :param packet_type: type of packet (control or data)
-        :type packet_type str
-        :param forwarded: was packet sent or forwarded by this node
-        :type forwarded bool
-        """
-        self.node_id = my_id
-        self.sent_at_time = sent_at_time
-        self.packet_type = packet_type
-        self.forwarded = forwarded
+# Larger than the default buffer, to cut down the number of write calls a save makes
+WRITE_BUFFER_SIZE = 1 << 20
 
 
 class Monitor:
     def __init__(self, max_sends, node_id, save_file_loc):
         self.max_sends = max_sends
         self.node_id = node_id
-        self.entries = []
+        self.entries: List[PacketEntry] = []
         self.save_file = save_file_loc
 
     def record_sent_packet(self, packet: ILNPPacket, forwarded=True):
-        if is_control_packet(packet):
-            self.entries.append(PacketEntry(self.node_id, time.time(), "control", forwarded))
-        else:
-            self.entries.append(PacketEntry(self.node_id, time.time(), "data", forwarded))
+        self.record_sent_packets(packet, 1, forwarded)
 
-        self.max_sends = self.max_sends - 1
+    def record_sent_packets(self, packet: ILNPPacket, n_copies: int, forwarded=True):
+        """Records copies of the same packet sent together, which share the packet type and send time"""
+        packet_type = "control" if is_control_packet(packet) else "data"
+        sent_at_time = time.time()
+        self.entries.extend([(self.node_id, sent_at_time, packet_type, forwarded)] * n_copies)
+        self.max_sends = self.max_sends - n_copies
 
     def save(self):
-        with open(self.save_file, "a+") as csv_file:
+        with open(self.save_file, "a+", buffering=WRITE_BUFFER_SIZE) as csv_file:
             logging.debug("Attempting to gain log file lock")
             while True:
                 # Loop to gain lock
@@ -61,11 +51,12 @@ class Monitor:
                         time.sleep(0.1)
 
             writer = csv.writer(csv_file, delimiter=',')
-            if os.path.getsize(self.save_file) is 0:
+            if os.path.getsize(self.save_file) == 0:
                 writer.writerow(["node_id", "sent_at_time", "packet_type", "forwarded"])
 
-            for entry in self.entries:
-                writer.writerow([entry.node_id, entry.sent_at_time, entry.packet_type, entry.forwarded])
+            writer.writerows(self.entries)
+            # Flushed while still locked, so rows from other nodes cannot land in the middle of these
+            csv_file.flush()
 
             # Unlock
             logging.debug("Unlocking file")
@@ -122,6 +113,7 @@ class MockDataGenerator:
 
 class SensorReading:
     struct_format = "!QfBHB"
+    STRUCT = struct.Struct(struct_format)
 
     def __init__(self, origin_id, temperature_kelvin, humidity_percentage, pressure_hpa, uv_index):
         self.origin_id = origin_id
@@ -131,12 +123,11 @@ class SensorReading:
         self.uv_index = uv_index
 
     def __bytes__(self):
-        return struct.pack(self.struct_format, self.origin_id, self.temperature, self.humidity, self.pressure,
-                           self.uv_index)
+        return self.STRUCT.pack(self.origin_id, self.temperature, self.humidity, self.pressure, self.uv_index)
 
     @classmethod
     def from_bytes(cls, payload):
-        (origin_id, temperature, humidity, pressure, uv_index) = struct.unpack(cls.struct_format, payload)
+        (origin_id, temperature, humidity, pressure, uv_index) = cls.STRUCT.unpack(payload)
         return SensorReading(origin_id, temperature, humidity, pressure, uv_index)
 
 
@@ -149,7 +140,7 @@ class SinkLog:
         self.readings.append(sensor_reading)
 
     def save(self):
-        with open(self.sink_save_file, "a+") as csv_file:
+        with open(self.sink_save_file, "a+", buffering=WRITE_BUFFER_SIZE) as csv_file:
             logging.debug("Attempting to gain sink log file lock")
             while True:
                 # Loop to gain lock
@@ -164,13 +155,13 @@ class SinkLog:
                         time.sleep(0.1)
 
             writer = csv.writer(csv_file, delimiter=',')
-            if os.path.getsize(self.sink_save_file) is 0:
+            if os.path.getsize(self.sink_save_file) == 0:
                 writer.writerow(["origin_id", "temperature", "humidity", "pressure", "uv_index"])
 
-            writer = csv.writer(csv_file, delimiter=',')
-            for sensor_reading in self.readings:
-                writer.writerow([sensor_reading.origin_id, sensor_reading.temperature, sensor_reading.humidity,
-                                 sensor_reading.pressure, sensor_reading.uv_index])
+            writer.writerows([(reading.origin_id, reading.temperature, reading.humidity, reading.pressure,
+                               reading.uv_index) for reading in self.readings])
+            # Other sink logs append to this file too, so the readings must be out before the lock goes
+            csv_file.flush()
 
             # Unlock
             logging.debug("Unlocking file")
@@ -1,22 +1,34 @@
 import logging
 import struct
-from functools import reduce
-from typing import List
+from typing import Dict, List, Union
 
 from ilnpsocket.underlay.routing.ilnp import NO_NEXT_HEADER_VALUE
 from ilnpsocket.underlay.routing.serializable import Serializable
 
 TYPE_VALUE_SIZE: int = struct.calcsize("!BB")
-LOCATOR_SIZE: int = struct.calcsize("!Q")
+LOCATOR_STRUCT: struct.Struct = struct.Struct("!Q")
+LOCATOR_SIZE: int = LOCATOR_STRUCT.size
+# Structs for packing lists of locators, keyed by the number of locators
+LOCATOR_LIST_STRUCTS: Dict[int, struct.Struct] = {}
 
 
-def parse_type(raw_bytes: memoryview) -> int:
-    return int(raw_bytes[0])
+def locator_list_struct(num_locs: int) -> struct.Struct:
+    """Provides the struct for a list of the given number of locators, compiling it only the first time"""
+    try:
+        return LOCATOR_LIST_STRUCTS[num_locs]
+    except KeyError:
+        list_struct = LOCATOR_LIST_STRUCTS[num_locs] = struct.Struct(RouteList.LOCATOR_FORMAT.format(num_locs))
+        return list_struct
+
+
+def parse_type(raw_bytes: memoryview, offset: int = 0) -> int:
+    return raw_bytes[offset]
 
 
 class DSRHeader(Serializable):
     FORMAT = "!BBH"
-    SIZE = struct.calcsize(FORMAT)
+    STRUCT = struct.Struct(FORMAT)
+    SIZE = STRUCT.size
 
     def __init__(self, next_header: int, is_flow_state: bool, payload_length: int):
         self.next_header: int = next_header
@@ -31,19 +43,24 @@ class DSRHeader(Serializable):
         return DSRHeader(NO_NEXT_HEADER_VALUE, False, payload_length)
 
     @classmethod
-    def from_bytes(cls, raw_bytes: memoryview) -> 'DSRHeader':
+    def from_bytes(cls, raw_bytes: memoryview, offset: int = 0) -> 'DSRHeader':
         """
         Creates an instance of DSRHeader from the given bytes object
         :param raw_bytes: bytes containing DSRHeader data
+        :param offset: position of the header within the bytes
         :return: DSRHeader instance
         :rtype DSRHeader
         """
-        next_header, flow_state, payload_length = struct.unpack(cls.FORMAT, raw_bytes[:cls.SIZE])
+        next_header, flow_state, payload_length = cls.STRUCT.unpack_from(raw_bytes, offset)
         flow_state = flow_state >> 7
         return DSRHeader(next_header, flow_state, payload_length)
 
     def __bytes__(self) -> bytes:
-        return struct.pack(self.FORMAT, self.next_header, self.is_flow_state << 7, self.payload_length)
+        return self.STRUCT.pack(self.next_header, self.is_flow_state << 7, self.payload_length)
+
+    def write_into(self, buffer: Union[bytearray, memoryview], offset: int) -> int:
+        self.STRUCT.pack_into(buffer, offset, self.next_header, self.is_flow_state << 7, self.payload_length)
+        return offset + self.SIZE
 
     def size_bytes(self):
         return self.SIZE
@@ -59,14 +76,10 @@ class RouteList(Serializable):
     def from_bytes(cls, packet_bytes: memoryview) -> 'RouteList':
         n_bytes_in_list = len(packet_bytes)
         if n_bytes_in_list == 0:
-            logging.debug("Empty route list read")
             return RouteList([])
         else:
             num_locs = n_bytes_in_list // LOCATOR_SIZE
-            logging.debug("Expecting %d locators", num_locs)
-            list_format = cls.LOCATOR_FORMAT.format(num_locs)
-            logging.debug("Format string: %s", list_format)
-            locators = list(struct.unpack(list_format, packet_bytes))
+            locators = list(locator_list_struct(num_locs).unpack(packet_bytes))
             return RouteList(locators)
 
     def __contains__(self, item: int) -> bool:
@@ -82,7 +95,12 @@ class RouteList(Serializable):
         return self.locators[index]
 
     def __bytes__(self) -> bytes:
-        return struct.pack(self.LOCATOR_FORMAT.format(len(self)), *self.locators)
+        return locator_list_struct(len(self.locators)).pack(*self.locators)
+
+    def write_into(self, buffer: Union[bytearray, memoryview], offset: int) -> int:
+        locators = self.locators
+        locator_list_struct(len(locators)).pack_into(buffer, offset, *locators)
+        return offset + len(locators) * LOCATOR_SIZE
 
     def size_bytes(self):
         return len(self) * LOCATOR_SIZE
@@ -97,7 +115,11 @@ class RouteList(Serializable):
 class RouteRequest(Serializable):
     TYPE = 1
     FORMAT = "!BBHQ"
-    FIXED_PART_SIZE = struct.calcsize(FORMAT)
+    STRUCT = struct.Struct(FORMAT)
+    FIXED_PART_SIZE = STRUCT.size
+    # Request id and target locator, as packed after the option type and data length
+    ID_AND_TARGET_STRUCT = struct.Struct("!HQ")
+    ID_AND_TARGET_OFFSET = TYPE_VALUE_SIZE
 
     def __init__(self, data_len: int, request_id: int, target_loc: int, route_list: RouteList):
         """
@@ -113,8 +135,11 @@ class RouteRequest(Serializable):
         self.route_list: RouteList = route_list
 
     def __bytes__(self) -> bytes:
-        return struct.pack(self.FORMAT, self.TYPE, self.data_len, self.request_id, self.target_loc) \
-               + bytes(self.route_list)
+        return self.STRUCT.pack(self.TYPE, self.data_len, self.request_id, self.target_loc) + bytes(self.route_list)
+
+    def write_into(self, buffer: Union[bytearray, memoryview], offset: int) -> int:
+        self.STRUCT.pack_into(buffer, offset, self.TYPE, self.data_len, self.request_id, self.target_loc)
+        return self.route_list.write_into(buffer, offset + self.FIXED_PART_SIZE)
 
     def __str__(self):
         return str(vars(self))
@@ -131,17 +156,18 @@ class RouteRequest(Serializable):
         return self.FIXED_PART_SIZE + self.route_list.size_bytes()
 
     @classmethod
-    def from_bytes(cls, raw_bytes: memoryview) -> 'RouteRequest':
-        opt_type, data_len, request_id, target_loc = struct.unpack(cls.FORMAT, raw_bytes[:cls.FIXED_PART_SIZE])
-        list_offset = cls.FIXED_PART_SIZE
-        route_list = RouteList.from_bytes(raw_bytes[list_offset:data_len + TYPE_VALUE_SIZE])
+    def from_bytes(cls, raw_bytes: memoryview, offset: int = 0) -> 'RouteRequest':
+        opt_type, data_len, request_id, target_loc = cls.STRUCT.unpack_from(raw_bytes, offset)
+        list_offset = offset + cls.FIXED_PART_SIZE
+        route_list = RouteList.from_bytes(raw_bytes[list_offset:offset + data_len + TYPE_VALUE_SIZE])
         return RouteRequest(data_len, request_id, target_loc, route_list)
 
 
 class RouteReply(Serializable):
     TYPE = 2
     FORMAT = "!BBB"
-    FIXED_PART_SIZE = struct.calcsize(FORMAT)
+    STRUCT = struct.Struct(FORMAT)
+    FIXED_PART_SIZE = STRUCT.size
 
     def __init__(self, data_len: int, last_hop_external: bool, route_list: RouteList):
         self.data_len: int = data_len
@@ -149,7 +175,7 @@ class RouteReply(Serializable):
         self.route_list: RouteList = route_list
 
     def __bytes__(self) -> bytes:
-        return struct.pack(self.FORMAT, self.TYPE, self.data_len, self.last_hop_external << 7) + bytes(self.route_list)
+        return self.STRUCT.pack(self.TYPE, self.data_len, self.last_hop_external << 7) + bytes(self.route_list)
 
     def __str__(self):
         return str(vars(self))
@@ -158,10 +184,10 @@ class RouteReply(Serializable):
         return self.FIXED_PART_SIZE + self.route_list.size_bytes()
 
     @classmethod
-    def from_bytes(cls, raw_bytes: memoryview):
-        opt_type, opt_len, last_hop_external = struct.unpack(cls.FORMAT, raw_bytes[:cls.FIXED_PART_SIZE])
+    def from_bytes(cls, raw_bytes: memoryview, offset: int = 0):
+        opt_type, opt_len, last_hop_external = cls.STRUCT.unpack_from(raw_bytes, offset)
         last_hop_external = last_hop_external >> 7
-        route_list = RouteList.from_bytes(raw_bytes[cls.FIXED_PART_SIZE:opt_len + TYPE_VALUE_SIZE])
+        route_list = RouteList.from_bytes(raw_bytes[offset + cls.FIXED_PART_SIZE:offset + opt_len + TYPE_VALUE_SIZE])
         return RouteReply(opt_len, last_hop_external, route_list)
 
     @classmethod
@@ -181,13 +207,23 @@ class RouteReply(Serializable):
         # i.e. (ID1)> (L1) <(ID2)> (L2)
         # ID1 sends to L2ID2, ID2 replies when receiving on L1, so needs to append L2 to path
         # ID1 sends to L1ID2, ID2 replies when receiving on L1, L1 already at end of path so shouldn't be added.
-        if route_list[len(route_list) - 1] != request_dest_loc:
+        if route_list[-1] != request_dest_loc:
             route_list.append(request_dest_loc)
 
         data_len = (cls.FIXED_PART_SIZE - TYPE_VALUE_SIZE) + route_list.size_bytes()
 
         return RouteReply(data_len, False, route_list)
 
+    def write_into(self, buffer: Union[bytearray, memoryview], offset: int) -> int:
+        """
+        Packs this reply into the buffer, such as over an existing serialized copy of it
+        :param buffer: buffer with room for this reply and its route list after the offset
+        :param offset: offset of this reply within the buffer
+        :return: offset of the end of this reply
+        """
+        self.STRUCT.pack_into(buffer, offset, self.TYPE, self.data_len, self.last_hop_external << 7)
+        return self.route_list.write_into(buffer, offset + self.FIXED_PART_SIZE)
+
     def change_route_list(self, better_path):
         self.route_list = RouteList(better_path)
         self.data_len = (self.FIXED_PART_SIZE - TYPE_VALUE_SIZE) + self.route_list.size_bytes()
@@ -196,7 +232,8 @@ class RouteReply(Serializable):
 class RouteError(Serializable):
     TYPE = 3
     FORMAT = "!BBBBQQ"
-    FIXED_PART_SIZE = struct.calcsize(FORMAT)
+    STRUCT = struct.Struct(FORMAT)
+    FIXED_PART_SIZE = STRUCT.size
     ERROR_TYPES = {
         1: "NODE_UNREACHABLE",
         2: "FLOW_STATE_UNSUPPORTED",
@@ -213,8 +250,8 @@ class RouteError(Serializable):
         self.type_specific_info = type_specific_info
 
     def __bytes__(self) -> bytes:
-        return struct.pack(self.FORMAT, self.TYPE, self.data_len, self.error_type, self.salvage, self.src_loc,
-                           self.dest_loc) + bytes(self.type_specific_info)
+        return self.STRUCT.pack(self.TYPE, self.data_len, self.error_type, self.salvage, self.src_loc,
+                                self.dest_loc) + bytes(self.type_specific_info)
 
     def size_bytes(self) -> int:
         return self.FIXED_PART_SIZE + self.type_specific_info.size_bytes()
@@ -223,9 +260,8 @@ class RouteError(Serializable):
         return str(vars(self))
 
     @classmethod
-    def from_bytes(cls, raw_bytes: memoryview) -> 'RouteError':
-        opt_type, data_len, error_type, salvage, src_loc, dest_loc = struct.unpack(cls.FORMAT,
-                                                                                   raw_bytes[:cls.FIXED_PART_SIZE])
+    def from_bytes(cls, raw_bytes: memoryview, offset: int = 0) -> 'RouteError':
+        opt_type, data_len, error_type, salvage, src_loc, dest_loc = cls.STRUCT.unpack_from(raw_bytes, offset)
         # TODO routeerrortypes
         return RouteError(data_len, error_type, salvage, src_loc, dest_loc, None)
 
@@ -233,10 +269,11 @@ class RouteError(Serializable):
 class PadOne(Serializable):
     TYPE = 244
     FORMAT = "!x"
-    SIZE = struct.calcsize(FORMAT)
+    STRUCT = struct.Struct(FORMAT)
+    SIZE = STRUCT.size
 
     def __bytes__(self) -> bytes:
-        return struct.pack(self.FORMAT)
+        return self.STRUCT.pack()
 
     def __str__(self):
         return str(vars(self))
@@ -245,8 +282,8 @@ class PadOne(Serializable):
         return self.SIZE
 
     @classmethod
-    def from_bytes(cls, raw_bytes: memoryview) -> 'PadOne':
-        struct.unpack(cls.FORMAT, raw_bytes[:cls.SIZE])
+    def from_bytes(cls, raw_bytes: memoryview, offset: int = 0) -> 'PadOne':
+        cls.STRUCT.unpack_from(raw_bytes, offset)
         return PadOne()
 
 
@@ -266,25 +303,60 @@ class DSRMessage(Serializable):
     @classmethod
     def from_bytes(cls, raw_bytes: memoryview) -> 'DSRMessage':
         header = DSRHeader.from_bytes(raw_bytes)
-        messages = cls.__parse_messages(raw_bytes[header.SIZE:], header.payload_length)
+        if header.payload_length == 0:
+            return DSRMessage(header, [])
+
+        messages = cls.__parse_messages(raw_bytes, header.SIZE, header.SIZE + header.payload_length)
         return DSRMessage(header, messages)
 
     @classmethod
-    def __parse_messages(cls, payload_bytes: memoryview, payload_length: int) -> List[Serializable]:
+    def __parse_messages(cls, raw_bytes: memoryview, offset: int, end: int) -> List[Serializable]:
+        """Parses each message in place between the offsets, rather than slicing the bytes from each message on"""
         messages = []
-        offset = 0
-        while offset < payload_length:
-            type_val = parse_type(payload_bytes[offset:])
-            logging.debug("Message type: %d", type_val)
-            message = MESSAGE_TYPES[type_val].from_bytes(payload_bytes[offset:])
-            logging.debug("Message received: %s", message)
+        debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+        while offset < end:
+            message = MESSAGE_TYPES[parse_type(raw_bytes, offset)].from_bytes(raw_bytes, offset)
+            if debug:
+                logging.debug("Message received: %s", message)
             offset = offset + message.size_bytes()
             messages.append(message)
 
         return messages
 
+    def offset_of(self, message: Serializable) -> int:
+        """Provides the offset of the given message within the serialized form of this message"""
+        offset = self.header.SIZE
+        for other in self.messages:
+            if other is message:
+                return offset
+            offset += other.size_bytes()
+
+        raise ValueError("Message is not part of this DSR message")
+
+    def serialize_with_trailing_locator(self, buffer: Union[bytearray, memoryview], offset: int, locator: int) -> int:
+        """
+        Writes the message into the buffer followed by one extra locator, so that the locator can later be
+        overwritten in place
+        :param buffer: buffer with room for the message and a locator after the offset
+        :param offset: position in the buffer to begin writing at
+        :param locator: locator to write after the message
+        :return: offset of the trailing locator
+        """
+        locator_offset = self.write_into(buffer, offset)
+        LOCATOR_STRUCT.pack_into(buffer, locator_offset, locator)
+        return locator_offset
+
+    def write_into(self, buffer: Union[bytearray, memoryview], offset: int) -> int:
+        """Packs the header and each message straight into the buffer, without serializing them separately first"""
+        offset = self.header.write_into(buffer, offset)
+        for message in self.messages:
+            offset = message.write_into(buffer, offset)
+        return offset
+
     def __bytes__(self):
-        return bytes(self.header) + reduce((lambda b, m: b + bytes(m)), self.messages, bytes())
+        parts = [bytes(self.header)]
+        parts.extend(bytes(message) for message in self.messages)
+        return b"".join(parts)
 
     def size_bytes(self):
-        return reduce((lambda s, m: s + m.size_bytes()), self.messages, self.header.SIZE)
+        return self.header.SIZE + sum(message.size_bytes() for message in self.messages)
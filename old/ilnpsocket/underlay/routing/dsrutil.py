@@ -1,92 +1,193 @@
 import collections
+import itertools
 from typing import List, Dict, Deque, Tuple, Optional, Set
 
 from ilnpsocket.underlay.routing.ilnp import ILNPPacket
 
 NUM_REQUEST_IDS = 512
+# Request ids wrap with a mask, so the number of ids must be a power of two
+REQUEST_ID_MASK = NUM_REQUEST_IDS - 1
+MAX_INDEXED_LOCATORS = 256
+
+# Shared between graphs so that a replacement graph never reuses the version of the one it replaced
+GRAPH_VERSIONS = itertools.count()
 
 
 class NetworkGraph:
+    """
+    Undirected graph of locators.
+
+    Each locator is given a small integer index, and edges are kept as lists of indices, so that searches walk plain
+    lists rather than hashing locators at every edge.
+    """
+
     def __init__(self, initial_locators: Set[int]):
-        self.nodes: Dict[int, Set[int]] = {}
+        # Locator to its index, the locator at each index, and the indices of the neighbours of each index
+        self.__index: Dict[int, int] = {}
+        self.__locators: List[Optional[int]] = []
+        self.__adjacency: List[List[int]] = []
+        # Indices left by removed nodes, reused before new ones are created
+        self.__free_indices: List[int] = []
+        # Reused by every search. An index has been visited by the current search only if its mark equals the search
+        # number, so the lists never need cleared between searches.
+        self.__predecessors: List[int] = []
+        self.__visit_marks: List[int] = []
+        self.__search_number: int = 0
+        # Changes whenever the graph is modified, so that results derived from it can be invalidated
+        self.version: int = next(GRAPH_VERSIONS)
 
         # Connect all initial locators to each other
-        for locator in initial_locators:
-            self.nodes[locator] = {loc for loc in initial_locators if loc != locator}
+        indices = [self.__index_of(locator) for locator in initial_locators]
+        for idx in indices:
+            self.__adjacency[idx] = [other for other in indices if other != idx]
 
     def __str__(self):
-        return str(self.nodes)
-
-    def get_shortest_path(self, start: int, end: int, path: Optional[List[int]] = None) -> Optional[List[int]]:
-        """Finds a path between the start and end node. Not necessarily the shortest"""
-        if path is None:
-            path = []
+        locators = self.__locators
+        return str({locators[idx]: {locators[n] for n in self.__adjacency[idx]} for idx in self.__index.values()})
+
+    def __index_of(self, node: int) -> int:
+        """Provides the index of the node, adding it without any edges if it is not yet in the graph"""
+        idx = self.__index.get(node)
+        if idx is not None:
+            return idx
+
+        if self.__free_indices:
+            idx = self.__free_indices.pop()
+            self.__locators[idx] = node
+        else:
+            idx = len(self.__locators)
+            self.__locators.append(node)
+            self.__adjacency.append([])
+            self.__predecessors.append(-1)
+            self.__visit_marks.append(0)
 
-        path = path + [start]
+        self.__index[node] = idx
+        return idx
 
+    def get_shortest_path(self, start: int, end: int) -> Optional[List[int]]:
+        """Finds a shortest path between the start and end node using a breadth first search"""
         if start == end:
-            return path
-        if not self.node_exists(start):
+            return [start]
+
+        start_idx = self.__index.get(start)
+        end_idx = self.__index.get(end)
+        if start_idx is None or end_idx is None:
             return None
 
-        shortest: Optional[List[int]] = None
-        for node in self.nodes[start]:
-            if node not in path:
-                new_path = self.get_shortest_path(node, end, path)
-                if new_path:
-                    if shortest is None or len(new_path) < len(shortest):
-                        shortest = new_path
+        self.__search_number += 1
+        search_number = self.__search_number
+        adjacency = self.__adjacency
+        predecessors = self.__predecessors
+        visit_marks = self.__visit_marks
+
+        visit_marks[start_idx] = search_number
+        to_visit: Deque[int] = collections.deque([start_idx])
+        while to_visit:
+            current = to_visit.popleft()
+            for idx in adjacency[current]:
+                if visit_marks[idx] == search_number:
+                    continue
+
+                visit_marks[idx] = search_number
+                predecessors[idx] = current
+                if idx == end_idx:
+                    return self.__trace_path(predecessors, start_idx, end_idx)
+
+                to_visit.append(idx)
 
-        return shortest
+        return None
+
+    def __trace_path(self, predecessors: List[int], start_idx: int, end_idx: int) -> List[int]:
+        locators = self.__locators
+        path = [locators[end_idx]]
+        idx = end_idx
+        while idx != start_idx:
+            idx = predecessors[idx]
+            path.append(locators[idx])
+
+        path.reverse()
+        return path
 
     def node_exists(self, node: int) -> bool:
-        return node in self.nodes
+        return node in self.__index
 
     def add_node(self, node):
-        self.nodes[node] = set()
+        idx = self.__index_of(node)
+        self.__adjacency[idx] = []
+        self.version = next(GRAPH_VERSIONS)
 
-    def add_vertex(self, start, end):
-        if not self.node_exists(start):
-            self.add_node(start)
+    def __connect(self, start_idx: int, end_idx: int):
+        start_neighbours = self.__adjacency[start_idx]
+        if end_idx not in start_neighbours:
+            start_neighbours.append(end_idx)
 
-        if not self.node_exists(end):
-            self.add_node(end)
+        end_neighbours = self.__adjacency[end_idx]
+        if start_idx not in end_neighbours:
+            end_neighbours.append(start_idx)
 
-        self.nodes[start].add(end)
-        self.nodes[end].add(start)
+    def add_vertex(self, start, end):
+        self.__connect(self.__index_of(start), self.__index_of(end))
+        self.version = next(GRAPH_VERSIONS)
 
     def remove_vertex(self, start, end):
-        if self.node_exists(start) and self.node_exists(end):
-            self.nodes[start].remove(end)
+        start_idx = self.__index.get(start)
+        end_idx = self.__index.get(end)
+        if start_idx is not None and end_idx is not None:
+            # Rebuilt in one pass, rather than searching the list once to test membership and again to remove
+            self.__adjacency[start_idx] = [idx for idx in self.__adjacency[start_idx] if idx != end_idx]
+            self.version = next(GRAPH_VERSIONS)
 
     def add_path(self, locators: List[int]):
-        path_length = len(locators)
-        for idx, node in enumerate(locators):
-            if idx != path_length - 1:
-                self.add_vertex(node, locators[idx + 1])
+        """Adds an edge between each consecutive pair of locators, changing the version only once"""
+        if len(locators) < 2:
+            return
+
+        indices = [self.__index_of(locator) for locator in locators]
+        for start_idx, end_idx in zip(indices, indices[1:]):
+            self.__connect(start_idx, end_idx)
+
+        self.version = next(GRAPH_VERSIONS)
 
     def remove_node(self, dest_loc):
-        if not self.node_exists(dest_loc):
+        idx = self.__index.pop(dest_loc, None)
+        if idx is None:
             return
 
-        connected_nodes: Set = self.nodes[dest_loc]
-        # Remove all references to this node
-        for node in connected_nodes:
-            self.nodes[node].remove(dest_loc)
+        # Remove all references to this node. Every list is scrubbed rather than only those of its neighbours, as
+        # remove_vertex removes one direction of an edge, and a stale reference would join the index's next locator.
+        adjacency = self.__adjacency
+        for neighbour, neighbours in enumerate(adjacency):
+            if idx in neighbours:
+                adjacency[neighbour] = [other for other in neighbours if other != idx]
 
-        # Remove this node
-        del self.nodes[dest_loc]
+        # Remove this node, leaving its index to be reused
+        adjacency[idx] = []
+        self.__locators[idx] = None
+        self.__free_indices.append(idx)
+        self.version = next(GRAPH_VERSIONS)
 
 
 class RecentRequestBuffer:
+    """
+    Remembers the most recently seen (src id, request id) pairs, in a small LRU so that lookups are a single hash.
+    """
+    NUM_TO_REMEMBER = 15
+
     def __init__(self):
-        self.recently_seen: Deque[Tuple[int, int]] = collections.deque(15 * [()])
+        self.recently_seen: collections.OrderedDict = collections.OrderedDict()
 
     def __str__(self):
         return str([str(x) for x in self.recently_seen])
 
     def add(self, src_id, request_id):
-        self.recently_seen.appendleft((src_id, request_id))
+        key = (src_id, request_id)
+        if key in self.recently_seen:
+            self.recently_seen.move_to_end(key)
+            return
+
+        self.recently_seen[key] = None
+        if len(self.recently_seen) > self.NUM_TO_REMEMBER:
+            self.recently_seen.popitem(last=False)
 
     def __contains__(self, src_id_request_id: Tuple[int, int]) -> bool:
         return src_id_request_id in self.recently_seen
@@ -105,9 +206,40 @@ class RequestRecord:
         self.time_since_last_attempt = self.time_since_last_attempt + 1
 
 
+class LocatorIndex:
+    """
+    Assigns each locator a small dense index as it is first seen, so per destination state can be held in lists.
+    Once the capacity is reached, new locators are left without an index.
+    """
+
+    def __init__(self, capacity: int = MAX_INDEXED_LOCATORS):
+        self.capacity: int = capacity
+        self.indexes: Dict[int, int] = {}
+        self.locators: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.locators)
+
+    def get(self, locator: int) -> Optional[int]:
+        return self.indexes.get(locator)
+
+    def get_or_assign(self, locator: int) -> Optional[int]:
+        index = self.indexes.get(locator)
+        if index is None and len(self.locators) < self.capacity:
+            index = len(self.locators)
+            self.indexes[locator] = index
+            self.locators.append(locator)
+
+        return index
+
+
 class RequestRecords:
-    def __init__(self):
+    def __init__(self, locator_index: LocatorIndex = None):
         self.records: List[Optional[RequestRecord]] = [None] * NUM_REQUEST_IDS
+        self.locator_index: LocatorIndex = locator_index if locator_index is not None else LocatorIndex()
+        # Bitmask of outstanding request ids for each indexed destination, with a dict for any beyond the index
+        self.dest_requests: List[int] = [0] * self.locator_index.capacity
+        self.overflow_dest_requests: Dict[int, int] = {}
 
     def __str__(self):
         return str([str(record) for record in self.records])
@@ -115,20 +247,40 @@ class RequestRecords:
     def __contains__(self, request_id: int) -> bool:
         return self.records[request_id] is not None
 
+    def __update_dest_mask(self, dest_loc: int, request_id: int, is_set: bool):
+        index = self.locator_index.get_or_assign(dest_loc)
+        mask = self.dest_requests[index] if index is not None else self.overflow_dest_requests.get(dest_loc, 0)
+        mask = mask | (1 << request_id) if is_set else mask & ~(1 << request_id)
+
+        if index is not None:
+            self.dest_requests[index] = mask
+        elif mask:
+            self.overflow_dest_requests[dest_loc] = mask
+        else:
+            self.overflow_dest_requests.pop(dest_loc, None)
+
     def add(self, request_id: int, dest_loc: int, num_attempts: int = 0):
+        if self.records[request_id] is not None:
+            self.pop(request_id)
+
         self.records[request_id] = RequestRecord(dest_loc, num_attempts)
+        self.__update_dest_mask(dest_loc, request_id, True)
 
     def pop(self, request_id: int):
         record = self.records[request_id]
         self.records[request_id] = None
+        if record is not None:
+            self.__update_dest_mask(record.dest_loc, request_id, False)
         return record
 
     def pop_by_dest(self, dest_loc: int):
-        requests_for_dest = [request_id for request_id, request in enumerate(self.records)
-                             if request is not None and request.dest_loc == dest_loc]
+        index = self.locator_index.get(dest_loc)
+        mask = self.dest_requests[index] if index is not None else self.overflow_dest_requests.get(dest_loc, 0)
 
-        for request in requests_for_dest:
-            self.pop(request)
+        while mask:
+            lowest_bit = mask & -mask
+            self.pop(lowest_bit.bit_length() - 1)
+            mask ^= lowest_bit
 
     def age_records(self):
         for record in self.records:
@@ -150,20 +302,38 @@ class RequestRecords:
 class DestinationQueues:
     """
     Maintains list of packets waiting for route to destination, and the request id of the RREQ that is fetching the
-    route.
+    route. Queues are held in a list by locator index, with a dict for any destinations beyond the index capacity.
     """
 
-    def __init__(self):
-        self.dest_queues: Dict[int, List[ILNPPacket]] = {}
+    def __init__(self, locator_index: LocatorIndex = None):
+        self.locator_index: LocatorIndex = locator_index if locator_index is not None else LocatorIndex()
+        self.dest_queues: List[Optional[List[ILNPPacket]]] = [None] * self.locator_index.capacity
+        self.overflow_queues: Dict[int, List[ILNPPacket]] = {}
+
+    def __find_queue(self, dest_loc: int) -> Optional[List[ILNPPacket]]:
+        index = self.locator_index.get(dest_loc)
+        if index is None:
+            return self.overflow_queues.get(dest_loc)
+
+        return self.dest_queues[index]
 
     def __contains__(self, dest_loc: int) -> bool:
-        return dest_loc in self.dest_queues
+        return self.__find_queue(dest_loc) is not None
 
     def __getitem__(self, dest_loc: int) -> List[ILNPPacket]:
-        return self.dest_queues[dest_loc]
+        queue = self.__find_queue(dest_loc)
+        if queue is None:
+            raise KeyError(dest_loc)
+
+        return queue
 
     def __str__(self):
-        return str({dest: [str(packet) for packet in queue] for dest, queue in self.dest_queues.items()})
+        return str({dest: [str(packet) for packet in queue] for dest, queue in self.items()})
+
+    def items(self) -> List[Tuple[int, List[ILNPPacket]]]:
+        indexed = [(self.locator_index.locators[index], queue) for index, queue in enumerate(self.dest_queues)
+                   if queue is not None]
+        return indexed + list(self.overflow_queues.items())
 
     def add_packet(self, packet: ILNPPacket):
         """
@@ -171,17 +341,29 @@ class DestinationQueues:
         :param packet: packet to add to queue
         """
         dest_loc = packet.dest.loc
+        index = self.locator_index.get_or_assign(dest_loc)
 
-        if dest_loc not in self:
-            self.dest_queues[dest_loc] = [packet]
+        if index is None:
+            self.overflow_queues.setdefault(dest_loc, []).append(packet)
+        elif self.dest_queues[index] is None:
+            self.dest_queues[index] = [packet]
         else:
-            self.dest_queues[dest_loc].append(packet)
+            self.dest_queues[index].append(packet)
 
     def remove_dest_queue(self, dest_loc: int):
-        del self.dest_queues[dest_loc]
+        self.pop_dest_queue(dest_loc)
 
     def pop_dest_queue(self, dest_loc: int) -> List[ILNPPacket]:
-        return self.dest_queues.pop(dest_loc)
+        index = self.locator_index.get(dest_loc)
+        if index is None:
+            return self.overflow_queues.pop(dest_loc)
+
+        queue = self.dest_queues[index]
+        if queue is None:
+            raise KeyError(dest_loc)
+
+        self.dest_queues[index] = None
+        return queue
 
 
 class RequestIdGenerator:
@@ -190,7 +372,7 @@ class RequestIdGenerator:
 
     def __next__(self):
         val = self.current
-        self.current = (self.current + 1) % NUM_REQUEST_IDS
+        self.current = (self.current + 1) & REQUEST_ID_MASK
         return val
 
     def __iter__(self):
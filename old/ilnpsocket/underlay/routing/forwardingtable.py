@@ -1,40 +1,47 @@
 import logging
-from typing import Dict, List
+import time
+from itertools import count, islice
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Shared by every table and drawn from by both the router and maintenance threads, as next() is atomic where += is not
+TABLE_VERSIONS = count()
 
 
 class ForwardingEntry:
     """
-    A record of the cost of a route via the next hop
+    A record of the cost of a route via the next hop, which expires unless refreshed within its lifetime
     """
+    __slots__ = ('cost', 'next_hop_locator', 'lifetime', 'expiry')
 
-    def __init__(self, next_hop_locator: int, cost: int):
+    def __init__(self, next_hop_locator: int, cost: int, lifetime: float):
         self.cost: int = cost
         self.next_hop_locator: int = next_hop_locator
-        self.left_to_live: int = 10
+        self.lifetime: float = lifetime
+        self.expiry: float = time.monotonic() + lifetime
 
     def __str__(self):
-        return str(vars(self))
+        return str({attr: getattr(self, attr) for attr in self.__slots__})
 
     def should_be_replaced_by(self, route_cost: int) -> bool:
         """A lower cost, or  equally good but more recent route cost will be preferred."""
-        if self.left_to_live == 0:
+        if self.expiry <= time.monotonic():
             return True
         else:
             return self.cost >= route_cost
 
-    def reset_ltl(self):
-        self.left_to_live = 10
-
-    def decrement_ltl(self):
-        self.left_to_live = self.left_to_live - 1
+    def refresh(self):
+        self.expiry = time.monotonic() + self.lifetime
 
 
 class NextHopList:
     """
-    A list of possible next hops, which can be aged and removed
+    A list of possible next hops, which expire and are removed if not refreshed.
+    Next hops are added by swapping in an updated copy of the entries, so they can be read and expired from another
+    thread without a lock.
     """
 
-    def __init__(self):
+    def __init__(self, lifetime: float):
+        self.lifetime: float = lifetime
         self.entries: Dict[int, ForwardingEntry] = {}
 
     def __contains__(self, next_hop_loc: int) -> bool:
@@ -46,13 +53,21 @@ class NextHopList:
     def __str__(self):
         return str([str(entry) for entry in self.entries])
 
-    def add_or_update(self, next_hop_loc: int, cost: int):
-        if next_hop_loc in self:
-            entry: ForwardingEntry = self.get_entry_for_next_hop(next_hop_loc)
+    def add_or_update(self, next_hop_loc: int, cost: int) -> bool:
+        """
+        :return: true if a next hop was added or its cost changed, rather than only being refreshed
+        """
+        entry: Optional[ForwardingEntry] = self.entries.get(next_hop_loc)
+        if entry is not None:
+            changed = entry.cost != cost
             entry.cost = cost
-            entry.reset_ltl()
+            entry.refresh()
+            return changed
         else:
-            self.entries[next_hop_loc] = ForwardingEntry(next_hop_loc, cost)
+            entries = dict(self.entries)
+            entries[next_hop_loc] = ForwardingEntry(next_hop_loc, cost, self.lifetime)
+            self.entries = entries
+            return True
 
     def get_entry_for_next_hop(self, next_hop_loc: int) -> ForwardingEntry:
         try:
@@ -60,34 +75,42 @@ class NextHopList:
         except KeyError:
             raise ValueError("No entry for %d" % next_hop_loc)
 
-    def refresh_ltl_for_hop(self, next_hop_loc: int):
-        self.get_entry_for_next_hop(next_hop_loc).reset_ltl()
+    def refresh_hop(self, next_hop_loc: int):
+        self.get_entry_for_next_hop(next_hop_loc).refresh()
 
-    def age_entries(self):
-        for entry in self.entries.values():
-            entry.decrement_ltl()
-
-        self.entries = {loc: entry for loc, entry in self.entries.items() if entry.left_to_live > 0}
+    def remove_expired(self, now: float):
+        entries = self.entries
+        if any(entry.expiry <= now for entry in entries.values()):
+            self.entries = {loc: entry for loc, entry in entries.items() if entry.expiry > now}
 
 
 class ForwardingTable:
     """
-    Forwarding table stores the next hops for destination locators. It is routinely cleared and so will require
-    updating.
+    Forwarding table stores the next hops for destination locators. Each next hop expires once it hasn't been proven
+    for the entry lifetime, so will require updating.
+    Destinations are added by swapping in an updated copy of the entries, so the router can read them while the
+    maintenance thread expires them, without a lock.
     """
 
     DEFAULT_COST = 50
+    MAX_CACHED_CANDIDATES = 1024
 
-    def __init__(self):
+    def __init__(self, entry_lifetime: float):
+        self.entry_lifetime: float = entry_lifetime
         self.entries: Dict[int, NextHopList] = {}
+        # Changes whenever the next hops or their costs change, so that cached candidates can be invalidated
+        self.version: int = next(TABLE_VERSIONS)
+        self.__candidates: Dict[Tuple[int, Optional[int]], Optional[Tuple[int, ...]]] = {}
+        self.__candidates_version: int = self.version
         logging.debug("Forwarding table initialized")
 
     def refresh_entry(self, dest_loc: int, next_hop_loc: int):
-        self.entries[dest_loc].refresh_ltl_for_hop(next_hop_loc)
+        self.entries[dest_loc].refresh_hop(next_hop_loc)
         logging.debug("Finished refreshing forwarding table entries")
 
     def __contains__(self, locator: int) -> bool:
-        return locator in self.entries and len(self.entries[locator]) > 0
+        next_hop_list = self.entries.get(locator)
+        return next_hop_list is not None and len(next_hop_list) > 0
 
     def __str__(self):
         val = ""
@@ -99,6 +122,50 @@ class ForwardingTable:
     def get_next_hop_list(self, dest_loc: int) -> NextHopList:
         return self.entries[dest_loc]
 
+    def find_next_hops(self, dest_loc: int) -> Optional[Dict[int, ForwardingEntry]]:
+        """Provides the next hop entries for the destination in a single lookup, or None if there are none"""
+        next_hop_list = self.entries.get(dest_loc)
+        if next_hop_list is None or len(next_hop_list) == 0:
+            return None
+
+        return next_hop_list.entries
+
+    def find_next_hop_candidates(self, dest_loc: int, arriving_loc: Optional[int]) -> Optional[Tuple[int, ...]]:
+        """
+        Provides the next hops worth choosing between for the destination: the two cheapest, excluding the arriving
+        interface whenever there is an alternative. Results are cached until the table next changes, and once the cache
+        is full the oldest half is evicted so the destinations in use stay cached.
+        :param dest_loc: destination locator
+        :param arriving_loc: interface the packet arrived on, or None if it came from this host
+        :return: one or two next hop locators, or None if there are no next hops for the destination
+        """
+        candidates = self.__candidates
+        if self.__candidates_version != self.version:
+            candidates = self.__candidates = {}
+            self.__candidates_version = self.version
+        elif len(candidates) >= self.MAX_CACHED_CANDIDATES:
+            # Dicts keep insertion order, so the first keys are those cached longest ago
+            for key in list(islice(candidates, len(candidates) // 2)):
+                del candidates[key]
+
+        key = (dest_loc, arriving_loc)
+        try:
+            return candidates[key]
+        except KeyError:
+            pass
+
+        next_hops = self.find_next_hops(dest_loc)
+        if next_hops is None:
+            result = None
+        else:
+            options = [entry for next_hop, entry in next_hops.items()
+                       if len(next_hops) == 1 or arriving_loc is None or next_hop != arriving_loc]
+            options.sort(key=lambda entry: entry.cost)
+            result = tuple(entry.next_hop_locator for entry in options[:2])
+
+        candidates[key] = result
+        return result
+
     def add_or_update_entry(self, dest_loc: int, next_hop_loc: int, cost: int = DEFAULT_COST):
         """
         :param dest_loc: destination that can be reached via the next hop
@@ -106,26 +173,58 @@ class ForwardingTable:
         :param cost: cost of route via the next hop
         """
         logging.debug("Adding dest %d via next hop %s with cost %d to forwarding table", dest_loc, next_hop_loc, cost)
-        if dest_loc not in self:
-            self.entries[dest_loc] = NextHopList()
+        next_hop_list = self.entries.get(dest_loc)
+        if next_hop_list is None:
+            entries = dict(self.entries)
+            next_hop_list = entries[dest_loc] = NextHopList(self.entry_lifetime)
+            self.entries = entries
 
-        self.entries[dest_loc].add_or_update(next_hop_loc, cost)
+        if next_hop_list.add_or_update(next_hop_loc, cost):
+            self.version = next(TABLE_VERSIONS)
 
-    def decrement_and_clear(self) -> bool:
+    def add_or_update_entries(self, dest_costs: Iterable[Tuple[int, int]], next_hop_loc: int):
+        """
+        Records that each of the destinations can be reached via the same next hop, in a single pass
+        :param dest_costs: pairs of destination locator and cost of the route to it via the next hop
+        :param next_hop_loc: next hop locator to reach the destinations
+        """
+        logging.debug("Adding destinations %s via next hop %s to forwarding table", dest_costs, next_hop_loc)
+        entries = self.entries
+        copied = False
+        for dest_loc, cost in dest_costs:
+            next_hop_list = entries.get(dest_loc)
+            if next_hop_list is None:
+                if not copied:
+                    entries = dict(entries)
+                    copied = True
+                next_hop_list = entries[dest_loc] = NextHopList(self.entry_lifetime)
+
+            if next_hop_list.add_or_update(next_hop_loc, cost):
+                self.version = next(TABLE_VERSIONS)
+
+        if copied:
+            self.entries = entries
+
+    def remove_expired(self) -> bool:
         """
-        Ages the contents of the forwarding table, and removes any entries that haven't been proven in a while
+        Removes any entries that haven't been proven within their lifetime, leaving those still fresh in place
         :return: true if any entries were removed
         """
-        logging.debug("Aging entries and removing expired")
+        logging.debug("Removing expired entries")
+        now = time.monotonic()
         removed = False
-        next_hop_lists = self.entries.values()
-        for next_hop_list in next_hop_lists:
+        entries = self.entries
+        for next_hop_list in entries.values():
             original_num_entries = len(next_hop_list)
-            next_hop_list.age_entries()
+            next_hop_list.remove_expired(now)
             if original_num_entries != len(next_hop_list):
                 removed = True
 
-        self.entries = {dest_loc: next_hop_list for dest_loc, next_hop_list in self.entries.items()
-                        if len(next_hop_list) > 0}
+        if removed:
+            # Emptied destinations are dropped in place rather than rebuilding the table, so that a rebuild cannot
+            # discard destinations the router adds in the meantime
+            for dest_loc in [dest_loc for dest_loc, next_hop_list in entries.items() if len(next_hop_list) == 0]:
+                entries.pop(dest_loc, None)
+            self.version = next(TABLE_VERSIONS)
 
         return removed
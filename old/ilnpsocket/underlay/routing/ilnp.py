@@ -1,5 +1,5 @@
 import struct
-from typing import Set, Union
+from typing import Dict, FrozenSet, Iterable, Optional, Tuple, Union
 
 from ilnpsocket.underlay.routing import serializable
 
@@ -8,6 +8,8 @@ NO_NEXT_HEADER_VALUE = 59
 
 
 class ILNPAddress:
+    __slots__ = ('loc', 'id')
+
     def __init__(self, loc: int, id: int):
         self.loc: int = loc
         self.id: int = id
@@ -19,7 +21,16 @@ class ILNPAddress:
 class ILNPPacket(serializable.Serializable):
     MAX_PAYLOAD_SIZE: int = 65535
     ILNPv6_HEADER_FORMAT: str = "!IHBB4Q"
-    HEADER_SIZE: int = struct.calcsize(ILNPv6_HEADER_FORMAT)
+    HEADER_STRUCT: struct.Struct = struct.Struct(ILNPv6_HEADER_FORMAT)
+    HEADER_SIZE: int = HEADER_STRUCT.size
+    # Offsets of the addresses within the header, each packed as a locator followed by an identifier
+    ADDRESS_STRUCT: struct.Struct = struct.Struct("!QQ")
+    SRC_ADDRESS_OFFSET: int = struct.calcsize("!IHBB")
+    DEST_ADDRESS_OFFSET: int = SRC_ADDRESS_OFFSET + ADDRESS_STRUCT.size
+    HOP_LIMIT_OFFSET: int = struct.calcsize("!IHB")
+
+    __slots__ = ('version', 'traffic_class', 'flow_label', 'payload_length', 'next_header', 'hop_limit', 'src', 'dest',
+                 'payload', 'datagram')
 
     def __init__(self, src: ILNPAddress, dest: ILNPAddress, next_header: int = 0,
                  hop_limit: int = 32, version: int = 6, traffic_class: int = 0,
@@ -42,56 +53,90 @@ class ILNPPacket(serializable.Serializable):
         self.dest: ILNPAddress = dest
 
         self.payload: bytearray = payload
+        # Received datagram the packet was parsed from, when it is kept to be forwarded without being serialized again
+        self.datagram: Optional[memoryview] = None
 
     def __str__(self):
         barrier = ("-" * 21) + "\n"
         row_format = "{:>15}|{:<15}\n"
-        field_dic = vars(self)
         view = "\n" + barrier
-        for name, value in field_dic.items():
-            view += row_format.format(name, str(value))
+        for name in self.__slots__:
+            view += row_format.format(name, str(getattr(self, name)))
 
         view += barrier
         return view
 
     @classmethod
-    def from_bytes(cls, packet_bytes: bytearray) -> 'ILNPPacket':
-        values = struct.unpack(cls.ILNPv6_HEADER_FORMAT, packet_bytes[:cls.HEADER_SIZE])
-
-        flow_label: int = values[0] & 1048575
-        traffic_class: int = (values[0] >> 20 & 255)
-        version: int = values[0] >> 28
-        payload_length: int = values[1]
-        next_header: int = values[2]
-        hop_limit: int = values[3]
-        src: ILNPAddress = ILNPAddress(values[4], values[5])
-        dest: ILNPAddress = ILNPAddress(values[6], values[7])
-
-        payload = packet_bytes[cls.HEADER_SIZE:cls.HEADER_SIZE + payload_length]
-
-        return ILNPPacket(src, dest, next_header, hop_limit, version, traffic_class, flow_label, payload_length,
-                          payload)
-
-    def decrement_hop_limit(self) -> None:
-        self.hop_limit -= 1
+    def from_bytes(cls, packet_bytes: Union[bytearray, memoryview]) -> 'ILNPPacket':
+        return cls.from_bytes_into(packet_bytes, cls.__new__(cls))
 
-    def __bytes__(self) -> bytes:
+    @classmethod
+    def from_bytes_into(cls, packet_bytes: Union[bytearray, memoryview], packet: 'ILNPPacket') -> 'ILNPPacket':
+        """
+        Populates an existing packet instance from the given bytes, so pooled packets can be reused
+        :param packet_bytes: bytes containing ILNPPacket data
+        :param packet: packet instance to overwrite every field of
+        :return: the given packet instance
+        """
+        values = cls.HEADER_STRUCT.unpack_from(packet_bytes)
+
+        packet.flow_label = values[0] & 1048575
+        packet.traffic_class = (values[0] >> 20 & 255)
+        packet.version = values[0] >> 28
+        packet.payload_length = payload_length = values[1]
+        packet.next_header = values[2]
+        packet.hop_limit = values[3]
+        # Addresses may outlive the packet in replies, so are never reused
+        packet.src = ILNPAddress(values[4], values[5])
+        packet.dest = ILNPAddress(values[6], values[7])
+
+        packet.payload = packet_bytes[cls.HEADER_SIZE:cls.HEADER_SIZE + payload_length]
+        packet.datagram = None
+        return packet
+
+    def __header_values(self) -> tuple:
         first_octet = self.flow_label | (self.traffic_class << 20) | (self.version << 28)
-        header_bytes = struct.pack(self.ILNPv6_HEADER_FORMAT,
-                                   first_octet,
-                                   self.payload_length, self.next_header, self.hop_limit,
-                                   self.src.loc, self.src.id, self.dest.loc, self.dest.id)
+        return (first_octet,
+                self.payload_length, self.next_header, self.hop_limit,
+                self.src.loc, self.src.id, self.dest.loc, self.dest.id)
+
+    def write_into(self, buffer: Union[bytearray, memoryview]) -> int:
+        """
+        Serializes the packet directly into the given buffer, so the payload is copied only once
+        :param buffer: writable buffer large enough to hold the header and payload
+        :return: number of bytes written
+        """
+        end = self.write_header_into(buffer) + len(self.payload)
+        buffer[self.HEADER_SIZE:end] = self.payload
+        return end
+
+    def write_header_into(self, buffer: Union[bytearray, memoryview]) -> int:
+        """
+        Serializes only the header into the start of the buffer, for when the payload is written there separately
+        :param buffer: writable buffer large enough to hold the header
+        :return: number of bytes written
+        """
+        self.HEADER_STRUCT.pack_into(buffer, 0, *self.__header_values())
+        return self.HEADER_SIZE
 
-        return header_bytes + self.payload
+    def __bytes__(self) -> bytes:
+        return self.HEADER_STRUCT.pack(*self.__header_values()) + self.payload
 
     def size_bytes(self):
         return self.HEADER_SIZE + self.payload_length
 
 
 class AddressHandler:
-    def __init__(self, my_id: int, my_locators: Set[int]):
+    __slots__ = ('my_id', 'my_locators', '__other_locators')
+
+    def __init__(self, my_id: int, my_locators: Iterable[int]):
         self.my_id = my_id
-        self.my_locators = my_locators
+        self.my_locators: FrozenSet[int] = frozenset(my_locators)
+
+        # Interfaces to forward on for each possible arriving interface, with None for packets from this host
+        self.__other_locators: Dict[Optional[int], Tuple[int, ...]] = {None: tuple(self.my_locators)}
+        for locator in self.my_locators:
+            self.__other_locators[locator] = tuple(loc for loc in self.my_locators if loc != locator)
 
     def is_my_address(self, address: ILNPAddress) -> bool:
         return (address.loc in self.my_locators) and address.id == self.my_id
@@ -105,6 +150,13 @@ class AddressHandler:
     def is_my_locator(self, locator: int) -> bool:
         return locator in self.my_locators
 
+    def get_other_locators(self, arriving_interface: Optional[int]) -> Tuple[int, ...]:
+        """Provides all of my locators other than the one the packet arrived on"""
+        try:
+            return self.__other_locators[arriving_interface]
+        except KeyError:
+            return self.__other_locators[None]
+
     def get_random_src_locator(self) -> int:
         return next(x for x in self.my_locators)
 
@@ -4,20 +4,19 @@ import random
 import threading
 import time
 from os import urandom
-from struct import unpack
-from typing import Dict, List, Iterable, Optional, Tuple
+from typing import Dict, List, Optional, Tuple, Union
 
 from experiment.config import Config
 from experiment.tools import Monitor
-from ilnpsocket.underlay.routing.dsrmessages import DSRHeader, DSRMessage, LOCATOR_SIZE, RouteRequest, RouteReply, \
-    RouteError
+from ilnpsocket.underlay.routing.dsrmessages import DSRHeader, DSRMessage, LOCATOR_SIZE, LOCATOR_STRUCT, RouteRequest, \
+    RouteReply, RouteError
 from ilnpsocket.underlay.routing.dsrutil import NetworkGraph, RequestRecords, RecentRequestBuffer, DestinationQueues, \
-    RequestIdGenerator
-from ilnpsocket.underlay.routing.forwardingtable import ForwardingTable, ForwardingEntry
-from ilnpsocket.underlay.routing.ilnp import ILNPPacket, DSR_NEXT_HEADER_VALUE, AddressHandler, ILNPAddress, \
-    is_control_packet
+    RequestIdGenerator, LocatorIndex
+from ilnpsocket.underlay.routing.forwardingtable import ForwardingTable
+from ilnpsocket.underlay.routing.ilnp import ILNPPacket, DSR_NEXT_HEADER_VALUE, AddressHandler, ILNPAddress
 from ilnpsocket.underlay.routing.listeningthread import ListeningThread
-from ilnpsocket.underlay.routing.queues import ReceivedQueue, PacketQueue
+from ilnpsocket.underlay.routing.parsingthread import ParsingThread
+from ilnpsocket.underlay.routing.queues import ReceivedQueue, PacketQueue, PacketPool, RawPacketQueue, BufferPool
 from ilnpsocket.underlay.routing.serializable import Serializable
 from ilnpsocket.underlay.sockets.listeningsocket import ListeningSocket
 from ilnpsocket.underlay.sockets.sendingsocket import SendingSocket
@@ -30,15 +29,58 @@ def create_receivers(locators_to_ipv6: Dict[int, str], port_number: int) -> List
             in locators_to_ipv6.items()]
 
 
+class RandomIdPool:
+    """
+    Hands out 64 bit values from a block read from the OSs RNG, so that only one read is needed per block of ids
+    """
+    BLOCK_SIZE = 4096
+    ID_SIZE = 8
+
+    def __init__(self):
+        self.__lock: threading.Lock = threading.Lock()
+        self.__block: bytes = b""
+        self.__offset: int = 0
+
+    def next_id(self) -> int:
+        with self.__lock:
+            if self.__offset + self.ID_SIZE > len(self.__block):
+                self.__block = urandom(self.BLOCK_SIZE)
+                self.__offset = 0
+
+            start = self.__offset
+            self.__offset = start + self.ID_SIZE
+            return int.from_bytes(self.__block[start:self.__offset], "big")
+
+
+RANDOM_ID_POOL = RandomIdPool()
+
+
 def create_random_id() -> int:
     """
     Uses the OSs RNG to produce an id for this node.
     :return: a 64 bit id with low likelihood of collision
     """
-    return unpack("!Q", urandom(8))[0]
+    return RANDOM_ID_POOL.next_id()
+
+
+MASK_64_BITS = (1 << 64) - 1
+
+
+def xorshift64(state: int) -> int:
+    """
+    Advances a xorshift64 generator, which is cheap enough to be used for every forwarded packet.
+    :param state: current non-zero state of the generator
+    :return: the next state, which is also the next random value
+    """
+    state ^= (state << 13) & MASK_64_BITS
+    state ^= state >> 7
+    state ^= (state << 17) & MASK_64_BITS
+    return state
 
 
 class ILNPNode(threading.Thread):
+    MAX_BATCH_SIZE = 64
+
     def __init__(self, conf: Config, received_packets_queue: ReceivedQueue, monitor: Monitor):
         super(ILNPNode, self).__init__()
 
@@ -50,13 +92,21 @@ class ILNPNode(threading.Thread):
 
         self.__to_be_routed_queue: PacketQueue = PacketQueue()
         self.__received_packets_queue = received_packets_queue
+        self.__packet_pool: PacketPool = PacketPool()
 
-        # Configures listening thread
+        # Configures listening thread, which leaves parsing to the parsing thread
+        raw_packets_queue: RawPacketQueue = RawPacketQueue()
         receivers = create_receivers(conf.locators_to_ipv6, conf.port)
-        self.__listening_thread = ListeningThread(receivers, self.__to_be_routed_queue, conf.packet_buffer_size_bytes)
+        buffer_pool: BufferPool = BufferPool(conf.packet_buffer_size_bytes)
+        self.__listening_thread = ListeningThread(receivers, raw_packets_queue, buffer_pool)
+        self.__buffer_pool: BufferPool = buffer_pool
+        self.__parsing_thread = ParsingThread(raw_packets_queue, self.__to_be_routed_queue, self.__packet_pool,
+                                              buffer_pool, self.address_handler)
 
         # Ensures that child threads die with parent
-        logging.debug("Starting listening thread")
+        logging.debug("Starting listening and parsing threads")
+        self.__parsing_thread.daemon = True
+        self.__parsing_thread.start()
         self.__listening_thread.daemon = True
         self.__listening_thread.start()
         self.monitor = monitor
@@ -68,52 +118,95 @@ class ILNPNode(threading.Thread):
     def run(self):
         """Polls for messages."""
         timeout = 10
-        while not self.__stop_event.is_set() and (self.monitor is None or self.monitor.max_sends > 0):
+        # Bound once, as they are used for every packet
+        monitor = self.monitor
+        stop_event = self.__stop_event
+        get_batch = self.__to_be_routed_queue.get_batch
+        router = self.router
+        backwards_learn = router.backwards_learn
+        handle_control_packet = router.handle_control_packet
+        route_packet = router.route_packet
+        my_id = self.address_handler.my_id
+        my_locators = self.address_handler.my_locators
+        release = self.__packet_pool.release
+        release_buffer = self.__buffer_pool.release
+        debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+        while not stop_event.is_set() and (monitor is None or monitor.max_sends > 0):
             try:
-                logging.debug("Polling for packet...")
+                if debug:
+                    logging.debug("Polling for packets...")
+                batch = get_batch(self.MAX_BATCH_SIZE, block=True, timeout=timeout)
+                if debug:
+                    logging.debug("%d packets arrived", len(batch))
+
                 packet: ILNPPacket
                 arriving_loc: int
-                logging.debug("Unfinished tasks: %d", self.__to_be_routed_queue.unfinished_tasks())
-                packet, arriving_loc = self.__to_be_routed_queue.get(block=True, timeout=timeout)
-                logging.debug("from %s, packet arrived: %s", arriving_loc, packet)
-
-                self.handle_packet(packet, arriving_loc)
-                self.__to_be_routed_queue.task_done()
+                for packet, arriving_loc in batch:
+                    if debug:
+                        logging.debug("from %s, packet arrived: %s", arriving_loc, packet)
+                    # Dispatched inline, to save a call for every packet
+                    # Packets from this host are never counted as forwarded, so whether one is only needs checking once
+                    if arriving_loc is not None:
+                        src = packet.src
+                        forwarded = src.id != my_id or src.loc not in my_locators
+                        if forwarded:
+                            backwards_learn(src.loc, arriving_loc)
+                    else:
+                        forwarded = False
+
+                    if packet.next_header == DSR_NEXT_HEADER_VALUE:
+                        handle_control_packet(packet, arriving_loc)
+                    else:
+                        route_packet(packet, arriving_loc, forwarded)
+
+                    # Only packets from this host can be held waiting for a route, so received ones are done with
+                    if arriving_loc is not None:
+                        datagram = packet.datagram
+                        if datagram is not None:
+                            packet.datagram = None
+                            release_buffer(datagram.obj)
+                        release(packet)
+                    if monitor is not None and monitor.max_sends <= 0:
+                        break
             except queue.Empty:
-                logging.debug("Timeout reached, router stopping.")
-                self.stop()
+                if not stop_event.is_set():
+                    logging.debug("Timeout reached, router stopping.")
+                    self.stop()
 
     def stop(self):
         logging.debug("Terminating")
         self.__stop_event.set()
+        # Wakes the run loop if it is waiting on an empty queue
+        self.__to_be_routed_queue.interrupt()
         logging.debug("Ending listening thread")
         self.__listening_thread.stop()
         logging.debug("Waiting for listening thread to join")
         self.__listening_thread.join()
+        logging.debug("Ending parsing thread")
+        self.__parsing_thread.stop()
         logging.debug("Closing sending socket")
         self.router.sender.close()
         logging.debug("Terminating maintenance thread")
         self.router.maintenance_thread.stop()
 
-    def handle_packet(self, packet: ILNPPacket, arriving_loc: int):
-        if not self.address_handler.is_from_me(packet) and arriving_loc is not None:
-            logging.debug("Backwards learning from packet src and arriving loc")
-            self.router.backwards_learn(packet.src.loc, arriving_loc)
-
-        if is_control_packet(packet):
-            logging.debug("Processing as control packet")
-            self.router.handle_control_packet(packet, arriving_loc)
-        else:
-            logging.debug("Processing as data packet")
-            self.router.route_packet(packet, arriving_loc)
-
     def send_from_host(self, payload: bytes, destination: ILNPAddress):
+        # Taken as bytes once here, as the packet may wait for a route and is serialized again for each send
+        if type(payload) is not bytes:
+            payload = bytes(payload)
         self.__to_be_routed_queue.add(self.router.construct_host_packet(payload, destination))
 
 
 class Router:
     MAX_NUM_RETRIES = 5
     TIME_BEFORE_RETRY = 10
+    MAX_CACHED_ROUTES = 1024
+    # Maintenance intervals a next hop stays in the forwarding table without being proven again
+    FORWARDING_ENTRY_LIFETIME_INTERVALS = 10
+
+    __slots__ = ('address_handler', 'received_packets_queue', 'sender', 'hop_limit', '__send_buffers', 'monitor',
+                 'request_id_generator', '__next_hop_rng_state', 'destination_queues', 'requests_made',
+                 'recently_seen_request_ids', 'forwarding_table', 'network_graph', '__route_cache',
+                 '__route_cache_version', '__rreq_template', '__rreq_packet', 'maintenance_thread')
 
     def __init__(self, address_handler: AddressHandler,
                  received_packets_queue: ReceivedQueue, conf: Config, monitor: Monitor):
@@ -123,20 +216,37 @@ class Router:
         self.sender = SendingSocket(conf.port, conf.locators_to_ipv6, conf.loopback)
         self.hop_limit: int = conf.hop_limit
 
+        # Reusable buffers packets are serialized into before sending. The maintenance thread also sends, so each
+        # sending thread is given its own buffer rather than sharing one behind a lock.
+        self.__send_buffers: threading.local = threading.local()
+
         self.monitor: Monitor = monitor
 
         # Control Plane Config
         self.request_id_generator: RequestIdGenerator = RequestIdGenerator()
+        # State of the generator used to choose between next hops, which must never be zero
+        self.__next_hop_rng_state: int = create_random_id() | 1
 
         # Buffers
-        self.destination_queues: DestinationQueues = DestinationQueues()
-        self.requests_made: RequestRecords = RequestRecords()
+        locator_index: LocatorIndex = LocatorIndex()
+        self.destination_queues: DestinationQueues = DestinationQueues(locator_index)
+        self.requests_made: RequestRecords = RequestRecords(locator_index)
         self.recently_seen_request_ids: RecentRequestBuffer = RecentRequestBuffer()
 
         # Network Knowledge
-        self.forwarding_table: ForwardingTable = ForwardingTable()
+        self.forwarding_table: ForwardingTable = ForwardingTable(
+            self.FORWARDING_ENTRY_LIFETIME_INTERVALS * conf.router_refresh_delay_secs)
         self.network_graph: NetworkGraph = self.init_network_graph()
-        logging.debug("Initial network graph: %s", str(self.network_graph))
+        logging.debug("Initial network graph: %s", self.network_graph)
+        # Simplified routes found in the network graph, valid until the graph version changes
+        self.__route_cache: Dict[Tuple[Optional[int], int], Optional[List[int]]] = {}
+        self.__route_cache_version: Optional[int] = None
+
+        # Route requests sent by this node only differ in their ids and addresses, so are patched from a template
+        self.__rreq_packet: ILNPPacket = self.construct_host_packet(
+            bytes(create_dsr_message(RouteRequest.build(0, 0))), ILNPAddress(0, 0))
+        self.__rreq_packet.next_header = DSR_NEXT_HEADER_VALUE
+        self.__rreq_template: bytes = bytes(self.__rreq_packet)
 
         # Maintenance
         logging.debug("Initializing and starting router maintenance thread")
@@ -144,12 +254,6 @@ class Router:
         self.maintenance_thread.daemon = True
         self.maintenance_thread.start()
 
-        self.handler_functions = {
-            RouteRequest.TYPE: self.__handle_route_request,
-            RouteReply.TYPE: self.__handle_route_reply,
-            RouteError.TYPE: self.__handle_route_error,
-        }
-
     def construct_host_packet(self, payload: bytes, dest: ILNPAddress, src: Optional[ILNPAddress] = None) -> ILNPPacket:
         if src is None:
             src = ILNPAddress(self.address_handler.get_random_src_locator(), self.address_handler.my_id)
@@ -160,76 +264,115 @@ class Router:
                           payload_length=len(payload),
                           hop_limit=self.hop_limit)
 
-    def route_packet(self, packet: ILNPPacket, arriving_interface: int = None):
-        if self.address_handler.is_my_locator(packet.dest.loc):
-            logging.debug("Packet destined for adjacent node")
-            self.route_to_adjacent_node(packet, arriving_interface)
-        else:
-            logging.debug("Packet destined for remote node")
-            self.route_to_remote_node(packet, arriving_interface)
-
-    def route_to_remote_node(self, packet: ILNPPacket, arriving_interface: int):
-        logging.debug("Routing packet to remove node")
-        next_hop_locator: int = self.get_next_hop(packet.dest.loc, arriving_interface)
+    def route_packet(self, packet: ILNPPacket, arriving_interface: int = None, forwarded: Optional[bool] = None):
+        """
+        Delivers, forwards, queues or discards the packet. Every outcome is decided here in one flat chain, as this is
+        called for every packet.
+        :param forwarded: whether the packet originated elsewhere, if already known by the caller
+        """
+        dest = packet.dest
+        dest_loc = dest.loc
+        address_handler = self.address_handler
+        if dest_loc in address_handler.my_locators:
+            # Inlined is_for_me, as the destination locator is already known to be one of mine
+            if dest.id == address_handler.my_id:
+                logging.debug("Packet for me: payload extracted")
+                self.received_packets_queue.add(packet.payload)
+            elif dest_loc != arriving_interface or arriving_interface is None:
+                logging.debug("Forwarding packet to final dest %d", dest_loc)
+                self.forward_packet_to_addresses(packet, (dest_loc,), forwarded=forwarded)
+            return
 
+        next_hop_locator: Optional[int] = self.get_next_hop(dest_loc, arriving_interface)
         if next_hop_locator is not None:
             logging.debug("Forwarding packet to %d.", next_hop_locator)
-            self.forward_packet_to_addresses(packet, [next_hop_locator])
-        if arriving_interface is None:
+            self.forward_packet_to_addresses(packet, (next_hop_locator,), forwarded=forwarded)
+        elif arriving_interface is None:
             logging.debug("No route found, sourcing route.")
             self.find_route_for_packet(packet)
         else:
             logging.debug("No route found: Packet discarded.")
 
-    def route_to_adjacent_node(self, packet: ILNPPacket, arriving_interface: int):
-        if self.address_handler.is_for_me(packet):
-            logging.debug("Packet for me: payload extracted")
-            self.received_packets_queue.add(packet.payload)
-        elif packet.dest.loc != arriving_interface or arriving_interface is None:
-            logging.debug("Forwarding packet to final dest %d", packet.dest.loc)
-            self.forward_packet_to_addresses(packet, [packet.dest.loc])
-
     def flood_to_neighbours(self, packet: ILNPPacket, arriving_interface: int = None):
-        logging.debug("Flooding all interfaces other than %d", arriving_interface)
-        next_hops = [x for x in self.address_handler.my_locators]
-
-        if arriving_interface in next_hops:
-            next_hops.remove(arriving_interface)
+        logging.debug("Flooding all interfaces other than %s", arriving_interface)
+        self.forward_packet_to_addresses(packet, self.address_handler.get_other_locators(arriving_interface))
 
-        self.forward_packet_to_addresses(packet, next_hops)
-
-    def forward_packet_to_addresses(self, packet: ILNPPacket, next_hop_locators: Iterable[int], decrement_hop=True):
+    def forward_packet_to_addresses(self, packet: ILNPPacket, next_hop_locators: Tuple[int, ...], decrement_hop=True,
+                                    forwarded: Optional[bool] = None):
         """
         Forwards packet to locator with given value if hop limit is still greater than 0.
         Decrements hop limit by one before forwarding.
         :param packet: packet to forward
-        :param next_hop_locators: set of locators (interfaces) to forward packet to
+        :param next_hop_locators: tuple of locators (interfaces) to forward packet to
         :param decrement_hop if true, the TTL in the packet will be decremented once before sending
+        :param forwarded: whether the packet originated elsewhere, if already known by the caller
+        """
+        if not self.__can_send(packet):
+            return
+
+        if decrement_hop:
+            packet.hop_limit -= 1
+
+        next_hop_locators = self.__limit_to_remaining_sends(next_hop_locators)
+        datagram = packet.datagram
+        if datagram is not None:
+            # Received packet is sent on unchanged apart from its hop limit, so the datagram is patched and reused
+            datagram[ILNPPacket.HOP_LIMIT_OFFSET] = packet.hop_limit
+            packet_bytes = datagram
+        else:
+            send_buffer = self.__get_send_buffer()
+            packet_bytes = send_buffer[:packet.write_into(send_buffer)]
+        self.forward_bytes_to_addresses(packet, packet_bytes, next_hop_locators, forwarded)
+
+    def forward_bytes_to_addresses(self, packet: ILNPPacket, packet_bytes: Union[bytes, memoryview],
+                                   next_hop_locators: Tuple[int, ...], forwarded: Optional[bool] = None):
         """
+        Sends bytes already serialized from the packet to each locator, and records each copy actually sent.
+        Checks on the hop limit and remaining sends are left to the caller.
+        :param packet: packet the bytes were serialized from
+        :param packet_bytes: serialized packet
+        :param next_hop_locators: locators (interfaces) to send the bytes to
+        :param forwarded: whether the packet originated elsewhere, worked out from its source if not given
+        """
+        logging.debug("Forwarding to %s", next_hop_locators)
+        n_sent = self.sender.sendMany(packet_bytes, next_hop_locators)
+
+        monitor = self.monitor
+        if monitor and n_sent:
+            if forwarded is None:
+                # Inlined is_from_me, as this is checked for every send
+                address_handler = self.address_handler
+                src = packet.src
+                forwarded = src.id != address_handler.my_id or src.loc not in address_handler.my_locators
+            # Copies sent in one call are recorded in one call
+            monitor.record_sent_packets(packet, n_sent, forwarded)
+
+    def __get_send_buffer(self) -> memoryview:
+        """Provides the calling thread's send buffer, creating it on first use"""
+        try:
+            return self.__send_buffers.buffer
+        except AttributeError:
+            buffer = memoryview(bytearray(ILNPPacket.HEADER_SIZE + ILNPPacket.MAX_PAYLOAD_SIZE))
+            self.__send_buffers.buffer = buffer
+            return buffer
+
+    def __can_send(self, packet: ILNPPacket) -> bool:
         if self.monitor and self.monitor.max_sends <= 0:
             logging.debug("Max sends reached. Cannot send.")
-            return
+            return False
 
         if packet.hop_limit <= 0:
             logging.debug("TTL expired: packet discarded")
-            return
+            return False
 
-        if decrement_hop:
-            logging.debug("TTL decremented")
-            packet.decrement_hop_limit()
-
-        forwarded = not self.address_handler.is_from_me(packet)
-        packet_bytes = bytes(packet)
-        for locator in next_hop_locators:
-            logging.debug("Forwarding to %d", locator)
-            self.sender.sendTo(packet_bytes, locator)
-
-            if self.monitor:
-                logging.debug("Recording sent packet")
-                self.monitor.record_sent_packet(packet, forwarded)
-                if self.monitor.max_sends <= 0:
-                    logging.debug("Max sends reached")
-                    return
+        return True
+
+    def __limit_to_remaining_sends(self, next_hop_locators: Tuple[int, ...]) -> Tuple[int, ...]:
+        if self.monitor:
+            # Only send as many copies as there are sends remaining
+            return next_hop_locators[:self.monitor.max_sends]
+
+        return next_hop_locators
 
     def init_network_graph(self) -> NetworkGraph:
         logging.debug("Initializing network graph")
@@ -255,26 +398,27 @@ class Router:
             logging.debug("Sending RREQ to %d:%d", dest_loc, dest_id)
             self.__send_route_request(ILNPAddress(dest_loc, dest_id), request.num_attempts)
 
-    def __create_rreq(self, dest_loc: int) -> RouteRequest:
-        request_id = next(self.request_id_generator)
-        logging.debug("Creating rreq with id %d for dest %d", request_id, dest_loc)
-        return RouteRequest.build(request_id, dest_loc)
-
     def __send_route_request(self, dest_addr: ILNPAddress, num_attempts: int = 0, arriving_interface: int = None):
-        rreq = self.__create_rreq(dest_addr.loc)
-        dsr_message = create_dsr_message(rreq)
-
-        next_hops = [x for x in self.address_handler.my_locators]
-        if arriving_interface in next_hops:
-            next_hops.remove(arriving_interface)
-
-        packet = self.construct_host_packet(bytes(dsr_message), dest_addr)
-        packet.next_header = DSR_NEXT_HEADER_VALUE
-        for next_hop in next_hops:
-            packet.src.loc = next_hop
-            self.forward_packet_to_addresses(packet, [next_hop], False)
-
-        self.requests_made.add(rreq.request_id, dest_addr.loc, num_attempts + 1)
+        request_id = next(self.request_id_generator)
+        logging.debug("Creating rreq with id %d for dest %d", request_id, dest_addr.loc)
+
+        packet = self.__rreq_packet
+        if self.__can_send(packet):
+            next_hops = self.__limit_to_remaining_sends(self.address_handler.get_other_locators(arriving_interface))
+            template = self.__rreq_template
+            packet_bytes = self.__get_send_buffer()[:len(template)]
+            packet_bytes[:] = template
+            ILNPPacket.ADDRESS_STRUCT.pack_into(packet_bytes, ILNPPacket.DEST_ADDRESS_OFFSET, dest_addr.loc, dest_addr.id)
+            RouteRequest.ID_AND_TARGET_STRUCT.pack_into(
+                packet_bytes, ILNPPacket.HEADER_SIZE + DSRHeader.SIZE + RouteRequest.ID_AND_TARGET_OFFSET,
+                request_id, dest_addr.loc)
+
+            # Each copy is sent from the interface it leaves on
+            for next_hop in next_hops:
+                LOCATOR_STRUCT.pack_into(packet_bytes, ILNPPacket.SRC_ADDRESS_OFFSET, next_hop)
+                self.forward_bytes_to_addresses(packet, packet_bytes, (next_hop,))
+
+        self.requests_made.add(request_id, dest_addr.loc, num_attempts + 1)
 
     def __get_remaining_hops(self, path: List[int]) -> int:
         n_hops = 0
@@ -312,9 +456,13 @@ class Router:
         packet = self.construct_host_packet(bytes(msg), original_packet.src, original_packet.dest)
         packet.next_header = DSR_NEXT_HEADER_VALUE
 
-        self.forward_packet_to_addresses(packet, [arrived_from_locator])
+        self.forward_packet_to_addresses(packet, (arrived_from_locator,))
 
     def find_route_for_packet(self, packet: ILNPPacket):
+        """
+        Queues the packet until a route to its destination is found. Only the first packet queued for a destination
+        starts a route request, so a burst of packets to the same destination causes a single flood.
+        """
         dest_loc = packet.dest.loc
 
         if dest_loc not in self.destination_queues:
@@ -325,15 +473,21 @@ class Router:
         self.destination_queues.add_packet(packet)
 
     def handle_control_packet(self, packet: ILNPPacket, arrived_from_locator: int):
-        if packet.next_header is not DSR_NEXT_HEADER_VALUE:
+        if packet.next_header != DSR_NEXT_HEADER_VALUE:
             logging.error("Unknown next header value")
             return
 
-        dsr_bytes = memoryview(packet.payload)[:packet.payload_length]
-        dsr_message = DSRMessage.from_bytes(dsr_bytes)
+        # Parsed packets already hold exactly payload_length bytes, so the payload is viewed without re-slicing
+        dsr_message = DSRMessage.from_bytes(memoryview(packet.payload))
         for message in dsr_message.messages:
             logging.debug("Calling handler function")
-            self.handler_functions[message.TYPE](packet, dsr_message, message, arrived_from_locator)
+            message_type = message.TYPE
+            if message_type == RouteRequest.TYPE:
+                self.__handle_route_request(packet, dsr_message, message, arrived_from_locator)
+            elif message_type == RouteReply.TYPE:
+                self.__handle_route_reply(packet, dsr_message, message, arrived_from_locator)
+            elif message_type == RouteError.TYPE:
+                self.__handle_route_error(packet, dsr_message, message, arrived_from_locator)
 
     def __handle_route_error(self, packet: ILNPPacket, dsr_message: DSRMessage, message: RouteError,
                              arrived_from_locator: int):
@@ -343,33 +497,56 @@ class Router:
     def __send_packets(self, packets: List[ILNPPacket], next_hop: int):
         logging.debug("Sending %d packets to %d", len(packets), next_hop)
         for packet in packets:
-            self.forward_packet_to_addresses(packet, [next_hop])
+            self.forward_packet_to_addresses(packet, (next_hop,))
 
     def __forward_route_request(self, packet: ILNPPacket, dsr_message: DSRMessage, message: RouteRequest,
                                 black_list: List[int]):
-        next_hops = [next_hop for next_hop in self.address_handler.my_locators if next_hop not in black_list]
-        original_list = message.route_list.locators.copy()
+        # my_locators is frozen, so the difference is a new set and the interfaces are never changed by a flood
+        next_hops = tuple(self.address_handler.my_locators.difference(black_list))
         logging.debug("Forwarding rreq to %s", next_hops)
+        if not next_hops:
+            return
 
-        for next_hop in next_hops:
-            message.route_list.locators = original_list + [next_hop]
+        # Each copy carries exactly one more locator than was received, so lengths only need updated once
+        message.data_len += LOCATOR_SIZE
+        dsr_message.header.payload_length += LOCATOR_SIZE
+        packet.payload_length += LOCATOR_SIZE
 
-            message.data_len += LOCATOR_SIZE
-            dsr_message.header.payload_length += LOCATOR_SIZE
-            packet.payload_length += LOCATOR_SIZE
-            packet.payload = bytes(dsr_message)
+        if not self.__can_send(packet):
+            return
 
-            logging.debug("Forwarding rreq with path %s", message.route_list.locators)
-            self.forward_packet_to_addresses(packet, [next_hop], False)
+        send_buffer = self.__get_send_buffer()
+        if message is not dsr_message.messages[-1]:
+            # Another option follows the route request, so the message is serialized again with each next hop added
+            original = message.route_list.locators
+            for next_hop in self.__limit_to_remaining_sends(next_hops):
+                message.route_list.locators = original + [next_hop]
+                packet.payload = bytes(dsr_message)
+
+                logging.debug("Forwarding rreq with path %s", message.route_list.locators)
+                self.forward_bytes_to_addresses(packet, send_buffer[:packet.write_into(send_buffer)], (next_hop,))
+            return
+
+        # The route request is the last option in the message, so only the trailing next hop changes between copies.
+        # The packet is serialized once, and each copy is sent after patching that locator in the send buffer.
+        # The message is written straight after the header in the send buffer, rather than into a payload to be copied.
+        payload_offset = packet.write_header_into(send_buffer)
+        next_hop_offset = dsr_message.serialize_with_trailing_locator(send_buffer, payload_offset, next_hops[0])
+        packet_bytes = send_buffer[:next_hop_offset + LOCATOR_SIZE]
+        packet.payload = packet_bytes[payload_offset:]
+        for next_hop in self.__limit_to_remaining_sends(next_hops):
+            LOCATOR_STRUCT.pack_into(packet_bytes, next_hop_offset, next_hop)
+
+            logging.debug("Forwarding rreq with path %s + [%d]", message.route_list.locators, next_hop)
+            self.forward_bytes_to_addresses(packet, packet_bytes, (next_hop,))
 
     def __update_route_cache_and_attempt_send(self, new_path: List[int], arrived_from_locator: int):
         logging.debug("Updating route cache using path %s arriving from %d", new_path, arrived_from_locator)
         self.network_graph.add_path(new_path)
-        cost = 0
+        # Every locator on the path is reached via the arriving interface, at a cost of its position on the path
+        self.forwarding_table.add_or_update_entries([(locator, cost) for cost, locator in enumerate(new_path)],
+                                                    arrived_from_locator)
         for locator in new_path:
-            # Add to forwarding table
-            self.forwarding_table.add_or_update_entry(locator, arrived_from_locator, cost)
-            cost += 1
             if locator in self.destination_queues:
                 logging.debug("Path found to %d: Sending waiting packets on interface %d", locator,
                               arrived_from_locator)
@@ -427,53 +604,55 @@ class Router:
         # Attempt to suggest better path before forwarding if not for me
         if not self.address_handler.is_for_me(packet):
             logging.debug("Attempting to get better path")
-            better_path = self.network_graph.get_shortest_path(full_path[0], full_path[len(full_path) - 1])
+            better_path = self.network_graph.get_shortest_path(full_path[0], full_path[-1])
             logging.debug("Path found: %s", better_path)
-            if len(better_path) < len(full_path):
+            if better_path is not None and len(better_path) < len(full_path):
                 logging.debug("Replacing original path")
-                rrply.change_route_list(better_path)
-                dsr_message.header.payload_length = rrply.size_bytes()
-                packet.payload_length = dsr_message.size_bytes()
-                packet.payload = bytes(dsr_message)
+                self.__replace_route_reply_path(packet, dsr_message, rrply, better_path)
 
             logging.debug("Forwarding rrply to dest")
             self.route_packet(packet, arrived_from_locator)
 
-    def __simplify_path(self, existing_route: List[int]):
-        if len(existing_route) == 1:
-            logging.debug("No more possibility to simplify path")
-            return existing_route
+    @staticmethod
+    def __replace_route_reply_path(packet: ILNPPacket, dsr_message: DSRMessage, rrply: RouteReply,
+                                   better_path: List[int]):
+        """
+        Shortens the path in the route reply. When the reply is the last option, its locators are rewritten in the
+        existing payload rather than serializing the whole message again.
+        """
+        rrply.change_route_list(better_path)
+        dsr_message.header.payload_length = dsr_message.size_bytes() - DSRHeader.SIZE
+
+        if rrply is not dsr_message.messages[-1]:
+            packet.payload = bytes(dsr_message)
+        else:
+            payload = bytearray(packet.payload)
+            payload[:DSRHeader.SIZE] = bytes(dsr_message.header)
+            del payload[rrply.write_into(payload, dsr_message.offset_of(rrply)):]
+            packet.payload = payload
+
+        packet.payload_length = len(packet.payload)
 
+    def __simplify_path(self, existing_route: List[int]) -> List[int]:
+        """Removes leading hops while the following hop is directly interfaced with this node"""
         my_locs = self.address_handler.my_locators
 
-        # Remove first hop if directly interfaced with second hop
-        if existing_route[1] in my_locs:
-            logging.debug("Removing first hop %d since directly interfaced with second hop %d", existing_route[0],
-                          existing_route[1])
-            existing_route[:] = existing_route[1:]
-            return self.__simplify_path(existing_route)
-        else:
-            logging.debug("Finished simplifying route")
-            return existing_route
+        first_hop = 0
+        while first_hop + 1 < len(existing_route) and existing_route[first_hop + 1] in my_locs:
+            logging.debug("Removing hop %d since directly interfaced with next hop %d", existing_route[first_hop],
+                          existing_route[first_hop + 1])
+            first_hop += 1
 
-    def __choose_next_hop_from_options(self, next_hops: Dict[int, ForwardingEntry], arriving_interface: int) -> int:
-        if len(next_hops) > 1 and arriving_interface is not None:
-            logging.debug("Removing arriving interface from potential options")
-            # Remove arriving interface
-            next_hops = {next_hop: entry for next_hop, entry in next_hops.items() if next_hop != arriving_interface}
+        logging.debug("Finished simplifying route")
+        return existing_route[first_hop:] if first_hop else existing_route
 
-        # If still more than one option remains, choose randomly from best two
+    def __choose_next_hop_from_options(self, next_hops: Tuple[int, ...]) -> int:
+        # If more than one option remains, choose randomly from the best two
         if len(next_hops) > 1:
-            logging.debug("Sorting options")
-            # Sort by cost
-            sorted_by_cost: List[Tuple[int, ForwardingEntry]] = sorted(next_hops.items(), key=lambda kv: kv[1].cost)
-            # Choose from first two
-            sorted_by_cost = sorted_by_cost[:2]
-            logging.debug("Two to be chosen from: %s", str([(tupl[0], tupl[1].cost) for tupl in sorted_by_cost]))
-            return random.choice(sorted_by_cost)[0]
+            self.__next_hop_rng_state = xorshift64(self.__next_hop_rng_state)
+            return next_hops[self.__next_hop_rng_state % len(next_hops)]
         else:
-            logging.debug("Only one hop available.")
-            return next(x for x in next_hops.values()).next_hop_locator
+            return next_hops[0]
 
     def get_next_hop(self, dest_locator: int, arriving_interface: int) -> Optional[int]:
         """
@@ -484,22 +663,18 @@ class Router:
         :param arriving_interface: locator interface that packet arrived on
         :return: list of viable next hops that should lead to the packets destination
         """
-        logging.debug("Current forwarding table:")
-        logging.debug(str(self.forwarding_table))
-        # Check if next hop in forwarding table
-        if dest_locator in self.forwarding_table:
-            logging.debug("Destination in forwarding table")
-            next_hops: Dict[int, ForwardingEntry] = self.forwarding_table.get_next_hop_list(dest_locator).entries
-            logging.debug("Possible next hops: %s", str([(i, str(x)) for i, x in next_hops.items()]))
-            return self.__choose_next_hop_from_options(next_hops, arriving_interface)
+        # Check if next hop in forwarding table, which is logged by the maintenance thread rather than per packet
+        next_hops: Optional[Tuple[int, ...]] = self.forwarding_table.find_next_hop_candidates(dest_locator,
+                                                                                               arriving_interface)
+        if next_hops is not None:
+            logging.debug("Possible next hops: %s", next_hops)
+            return self.__choose_next_hop_from_options(next_hops)
         else:
             # Check if route exists in current network topology knowledge
             logging.debug("Checking if route can be found from known topology")
-            existing_route = self.network_graph.get_shortest_path(arriving_interface, dest_locator)
+            existing_route = self.__find_route_in_graph(arriving_interface, dest_locator)
             if existing_route:
                 logging.debug("Found route in cache!: %s", existing_route)
-                existing_route = self.__simplify_path(existing_route)
-                logging.debug("Route simplified to %s", existing_route)
                 shortest: int = existing_route[0]
                 # Add missing entry to forwarding table
                 self.forwarding_table.add_or_update_entry(dest_locator, shortest, len(existing_route))
@@ -509,6 +684,20 @@ class Router:
                 logging.debug("Unable to determine next hop")
                 return None
 
+    def __find_route_in_graph(self, arriving_interface: Optional[int], dest_locator: int) -> Optional[List[int]]:
+        """Finds and simplifies a route using the network graph, reusing the result until the graph changes"""
+        graph = self.network_graph
+        if self.__route_cache_version != graph.version or len(self.__route_cache) >= self.MAX_CACHED_ROUTES:
+            self.__route_cache.clear()
+            self.__route_cache_version = graph.version
+
+        key = (arriving_interface, dest_locator)
+        if key not in self.__route_cache:
+            route = graph.get_shortest_path(arriving_interface, dest_locator)
+            self.__route_cache[key] = self.__simplify_path(route) if route else None
+
+        return self.__route_cache[key]
+
     def backwards_learn(self, src_loc: int, arriving_loc: int):
         self.forwarding_table.add_or_update_entry(src_loc, arriving_loc)
 
@@ -531,23 +720,19 @@ class MaintenanceThread(threading.Thread):
         """
         while not self.stopped.is_set():
             logging.debug("Maintenance thread woke")
-            # Log current status
-            logging.debug("Current status:")
-            logging.debug("Forwarding table:")
-            logging.debug(str(self.router.forwarding_table))
-            logging.debug("Network graph:")
-            logging.debug(str(self.router.network_graph))
-            logging.debug("Destination queues:")
-            logging.debug(str(self.router.destination_queues))
-            logging.debug("Requests made:")
-            logging.debug(str(self.router.requests_made))
-            logging.debug("Recently seen requests")
-            logging.debug(str(self.router.recently_seen_request_ids))
-            logging.debug("End of current status")
-
-            # Age and clear network graph once unreliable
-            logging.debug("Aging forwarding table")
-            nodes_have_expired = self.router.forwarding_table.decrement_and_clear()
+            # Log current status, only building the dumps when they will be shown
+            if logging.getLogger().isEnabledFor(logging.DEBUG):
+                logging.debug("Current status:")
+                logging.debug("Forwarding table:\n%s", self.router.forwarding_table)
+                logging.debug("Network graph:\n%s", self.router.network_graph)
+                logging.debug("Destination queues:\n%s", self.router.destination_queues)
+                logging.debug("Requests made:\n%s", self.router.requests_made)
+                logging.debug("Recently seen requests\n%s", self.router.recently_seen_request_ids)
+                logging.debug("End of current status")
+
+            # Expire stale next hops and clear network graph once unreliable
+            logging.debug("Expiring forwarding table entries")
+            nodes_have_expired = self.router.forwarding_table.remove_expired()
             if nodes_have_expired:
                 logging.debug("Destinations possibly lost, clearing network graph")
                 self.router.network_graph = self.router.init_network_graph()
@@ -557,9 +742,9 @@ class MaintenanceThread(threading.Thread):
             logging.debug("Attemtping to retry requests")
             self.router.retry_old_requests()
 
-            # Sleep
+            # Sleep, waking early if stopped
             logging.debug("Maintenance thread sleeping")
-            time.sleep(self.maintenance_interval)
+            self.stopped.wait(self.maintenance_interval)
 
 
 def create_dsr_message(message: Serializable) -> DSRMessage:
@@ -1,41 +1,108 @@
+import asyncio
+import errno
 import logging
 import threading
-import select
-from typing import List
+from typing import List, Optional
 
-from ilnpsocket.underlay.routing.ilnp import ILNPPacket
-from ilnpsocket.underlay.routing.queues import PacketQueue
-from ilnpsocket.underlay.sockets.listeningsocket import ListeningSocket
+from ilnpsocket.underlay.routing.queues import RawPacketQueue, BufferPool
+from ilnpsocket.underlay.sockets.listeningsocket import ListeningSocket, RECVMMSG, build_receive_messages, point_iov_at
 
 
 class ListeningThread(threading.Thread):
+    # Limit on datagrams read from one socket per wake, so a busy interface cannot starve the others
+    MAX_READS_PER_WAKE = 32
 
-    def __init__(self, listening_sockets: List[ListeningSocket], inbound_queue: PacketQueue, buffer_size_bytes: int,
-                 timeout: int = None):
+    def __init__(self, listening_sockets: List[ListeningSocket], raw_queue: RawPacketQueue, buffer_pool: BufferPool):
         super(ListeningThread, self).__init__()
         self.__listening_sockets: List[ListeningSocket] = listening_sockets
         self.__stopped: bool = False
-        self.__timeout: int = timeout
-        self.__buffer_size: int = buffer_size_bytes
-        self.__queue: PacketQueue = inbound_queue
+        self.__loop: Optional[asyncio.AbstractEventLoop] = None
+        self.__buffer_pool: BufferPool = buffer_pool
+        self.__queue: RawPacketQueue = raw_queue
+        # Where available, each wake reads every waiting datagram in one call, straight into pooled buffers
+        self.__batch_buffers: Optional[List[bytearray]] = None
+        self.__batch_messages = None
+        if RECVMMSG is not None:
+            self.__batch_buffers = [buffer_pool.acquire() for _ in range(self.MAX_READS_PER_WAKE)]
+            self.__batch_messages = build_receive_messages(self.__batch_buffers)
         logging.debug("Listening thread initialized.")
 
     def run(self):
-        """Continuously checks for incoming packets on each listening socket and
-        adds new packets to the message queue"""
-        while not self.__stopped:
-            ready_socks, _, _ = select.select(self.__listening_sockets, [], [], self.__timeout)
-            for sock in ready_socks:
-                self.read_sock(sock)
+        """Reads from each listening socket as it becomes readable on this thread's event loop, and
+        adds the raw datagrams to the queue to be parsed"""
+        self.__loop = asyncio.new_event_loop()
+        for sock in self.__listening_sockets:
+            self.__loop.add_reader(sock.fileno(), self.read_sock, sock)
+
+        try:
+            if not self.__stopped:
+                self.__loop.run_forever()
+        finally:
+            for sock in self.__listening_sockets:
+                self.__loop.remove_reader(sock.fileno())
+            self.__loop.close()
 
     def read_sock(self, sock: ListeningSocket):
-        buffer = bytearray(self.__buffer_size)
-        n_bytes_to_read, addr_info = sock.recvfrom_into(buffer)
-        packet = ILNPPacket.from_bytes(buffer)
-        logging.debug("Packet parsed from socket")
-        self.__queue.add(packet, sock.locator)
+        """Reads every datagram waiting on the socket, up to the limit per wake"""
+        if self.__batch_messages is not None:
+            try:
+                self.__read_batch(sock)
+                return
+            except OSError as err:
+                if err.errno != errno.ENOSYS:
+                    raise
+
+                logging.debug("recvmmsg not supported by kernel, falling back to one recvfrom per datagram")
+                self.__batch_messages = None
+                for buffer in self.__batch_buffers:
+                    self.__buffer_pool.release(buffer)
+                self.__batch_buffers = None
+
+        buffer_pool = self.__buffer_pool
+        add = self.__queue.add
+        locator = sock.locator
+        for _ in range(self.MAX_READS_PER_WAKE):
+            # The parsing thread returns the buffer to the pool once it has parsed the datagram
+            buffer = buffer_pool.acquire()
+            try:
+                n_bytes_to_read, addr_info = sock.recvfrom_into(buffer)
+            except BlockingIOError:
+                buffer_pool.release(buffer)
+                return
+
+            add(buffer, n_bytes_to_read, locator)
+
+    def __read_batch(self, sock: ListeningSocket):
+        """Reads the datagrams waiting on the socket in a single call, each into its own pooled buffer"""
+        messages, iovs = self.__batch_messages
+        try:
+            n_read = sock.recvmmsg(messages, self.MAX_READS_PER_WAKE)
+        except BlockingIOError:
+            return
+
+        buffers = self.__batch_buffers
+        acquire = self.__buffer_pool.acquire
+        add = self.__queue.add
+        locator = sock.locator
+        for idx in range(n_read):
+            # The parsing thread returns the buffer to the pool once it has parsed the datagram, so the message is
+            # given a fresh one to read into next time
+            add(buffers[idx], messages[idx].msg_len, locator)
+            buffer = buffers[idx] = acquire()
+            point_iov_at(iovs[idx], buffer)
 
     def stop(self):
         self.__stopped = True
+        loop = self.__loop
+        if loop is not None and not loop.is_closed():
+            try:
+                loop.call_soon_threadsafe(loop.stop)
+            except RuntimeError:
+                # Loop closed between the check and the call
+                pass
+
+        if self.is_alive():
+            self.join()
+
         for socket in self.__listening_sockets:
             socket.close()
@@ -0,0 +1,68 @@
+import logging
+import queue
+import threading
+
+from ilnpsocket.underlay.routing.ilnp import ILNPPacket, DSR_NEXT_HEADER_VALUE, AddressHandler
+from ilnpsocket.underlay.routing.queues import PacketQueue, PacketPool, RawPacketQueue, BufferPool
+
+
+class ParsingThread(threading.Thread):
+    """
+    Parses raw datagrams read by the listening thread into packets, so that the listening thread is free to keep
+    reading from its sockets. A single parser keeps packets in the order they were read.
+
+    Data packets for other nodes can only be forwarded unchanged or discarded, so they keep the datagram they were read
+    into rather than copying their payload out of it. Forwarding them only patches the hop limit byte of the datagram.
+    The router hands the buffer back once it is done with them.
+    """
+
+    MAX_BATCH_SIZE = 64
+
+    def __init__(self, raw_queue: RawPacketQueue, inbound_queue: PacketQueue, packet_pool: PacketPool,
+                 buffer_pool: BufferPool, address_handler: AddressHandler):
+        super(ParsingThread, self).__init__()
+        self.__stopped: bool = False
+        self.__address_handler: AddressHandler = address_handler
+        self.__raw_queue: RawPacketQueue = raw_queue
+        self.__queue: PacketQueue = inbound_queue
+        self.__packet_pool: PacketPool = packet_pool
+        self.__buffer_pool: BufferPool = buffer_pool
+        logging.debug("Parsing thread initialized.")
+
+    def run(self):
+        """Continuously parses raw datagrams and adds the packets to the queue to be routed"""
+        # Bound once, as they are used for every datagram
+        get_batch = self.__raw_queue.get_batch
+        acquire = self.__packet_pool.acquire
+        release_buffer = self.__buffer_pool.release
+        add = self.__queue.add
+        my_id = self.__address_handler.my_id
+        my_locators = self.__address_handler.my_locators
+        header_size = ILNPPacket.HEADER_SIZE
+        while not self.__stopped:
+            try:
+                batch = get_batch(self.MAX_BATCH_SIZE, True)
+            except queue.Empty:
+                # Only raised once the queue has been interrupted to stop this thread
+                continue
+
+            for buffer, n_bytes, locator in batch:
+                if n_bytes < header_size:
+                    logging.debug("Datagram of %d bytes is too short for a packet header: discarded", n_bytes)
+                    release_buffer(buffer)
+                    continue
+
+                datagram = memoryview(buffer)[:n_bytes]
+                packet = ILNPPacket.from_bytes_into(datagram, acquire())
+                dest = packet.dest
+                if packet.next_header != DSR_NEXT_HEADER_VALUE and (dest.id != my_id or dest.loc not in my_locators):
+                    packet.datagram = datagram
+                else:
+                    # Buffer is returned to the pool, so the packet takes its own copy of only the payload
+                    packet.payload = bytes(packet.payload)
+                    release_buffer(buffer)
+                add(packet, locator)
+
+    def stop(self):
+        self.__stopped = True
+        self.__raw_queue.interrupt()
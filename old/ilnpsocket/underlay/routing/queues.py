@@ -1,27 +1,123 @@
 import logging
-from queue import Queue
+import time
+from collections import deque
+from queue import Queue, Empty
+from threading import Event
+from typing import Any, Deque, List, Tuple
 
 from ilnpsocket.underlay.routing.ilnp import ILNPPacket
 
 
+class RingQueue:
+    """
+    Unbounded queue for many producers and a single consumer. Appending to and popping from a deque are atomic, so
+    items are passed without taking a lock. The consumer only waits on the event when it finds the queue empty, and
+    producers only set the event when the consumer may be waiting for it.
+
+    Shutdown is signalled with interrupt rather than by queueing a placeholder item, so the consumer never has to
+    check what it was given.
+    """
+
+    def __init__(self):
+        self.__items: Deque[Any] = deque()
+        self.__not_empty: Event = Event()
+        self.__interrupted: bool = False
+
+    def __len__(self) -> int:
+        return len(self.__items)
+
+    def put(self, item: Any):
+        self.__items.append(item)
+        if not self.__not_empty.is_set():
+            self.__not_empty.set()
+
+    def interrupt(self):
+        """Wakes the consumer, and makes any get on the empty queue raise queue.Empty from now on"""
+        self.__interrupted = True
+        self.__not_empty.set()
+
+    def get(self, block: bool = True, timeout: float = None) -> Any:
+        """Removes the oldest item, raising queue.Empty if none arrives before the timeout or an interrupt"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                return self.__items.popleft()
+            except IndexError:
+                pass
+
+            if not block or self.__interrupted:
+                raise Empty
+
+            # Cleared before checking again, so an item added after the check always sets the event
+            self.__not_empty.clear()
+            if self.__items:
+                continue
+
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise Empty
+
+            self.__not_empty.wait(remaining)
+
+    def get_batch(self, max_n: int, block: bool = True, timeout: float = None) -> List[Any]:
+        """Waits for one item as get does, then takes any others already waiting up to max_n items in total"""
+        batch = [self.get(block, timeout)]
+        # Only this consumer removes items, so at least as many as counted now are still there to be taken
+        popleft = self.__items.popleft
+        for _ in range(min(len(self.__items), max_n - 1)):
+            batch.append(popleft())
+
+        return batch
+
+
 class PacketQueue:
     def __init__(self):
-        self.queue = Queue()
+        self.queue = RingQueue()
+        # Checked once, as every packet passes through here
+        self.debug: bool = logging.getLogger().isEnabledFor(logging.DEBUG)
 
     def add(self, packet_to_route: ILNPPacket, arriving_locator: int = None):
-        logging.debug("Adding packet with src %s dest %s arriving on %s to queue.", packet_to_route.src,
-                      packet_to_route.dest, arriving_locator)
+        if self.debug:
+            logging.debug("Adding packet with src %s dest %s arriving on %s to queue.", packet_to_route.src,
+                          packet_to_route.dest, arriving_locator)
         self.queue.put((packet_to_route, arriving_locator))
 
     def get(self, block: bool, timeout: int = None) -> (ILNPPacket, int):
-        logging.debug("Waiting %d secs before timeout: %s", timeout, block)
+        logging.debug("Waiting %s secs before timeout: %s", timeout, block)
         return self.queue.get(block, timeout)
 
-    def task_done(self):
-        self.queue.task_done()
+    def get_batch(self, max_n: int, block: bool = True, timeout: int = None) -> List[Tuple[ILNPPacket, int]]:
+        """Waits for one packet as get does, then drains up to max_n packets in total."""
+        return self.queue.get_batch(max_n, block, timeout)
+
+    def interrupt(self):
+        self.queue.interrupt()
 
-    def unfinished_tasks(self):
-        return self.queue.unfinished_tasks
+    def __len__(self) -> int:
+        return len(self.queue)
+
+
+class RawPacketQueue:
+    """
+    Datagrams read from sockets that are still to be parsed, as the pooled buffer holding the datagram, the number
+    of bytes read into it and the locator they arrived on
+    """
+
+    def __init__(self):
+        self.queue = RingQueue()
+
+    def add(self, buffer: bytearray, n_bytes: int, arriving_locator: int):
+        self.queue.put((buffer, n_bytes, arriving_locator))
+
+    def get(self, block: bool = True, timeout: int = None) -> Tuple[bytearray, int, int]:
+        return self.queue.get(block, timeout)
+
+    def get_batch(self, max_n: int, block: bool = True, timeout: int = None) -> List[Tuple[bytearray, int, int]]:
+        """Waits for one datagram as get does, then drains up to max_n datagrams in total."""
+        return self.queue.get_batch(max_n, block, timeout)
+
+    def interrupt(self):
+        self.queue.interrupt()
 
 
 class ReceivedQueue:
@@ -36,3 +132,45 @@ class ReceivedQueue:
 
     def task_done(self):
         self.queue.task_done()
+
+
+class PacketPool:
+    """
+    Freelist of packet instances, so packets parsed from datagrams can reuse objects the router has finished with.
+    Appending and popping from a deque is atomic, so the parsing thread can acquire packets and the node's run loop
+    release them without a lock.
+    """
+
+    def __init__(self, max_size: int = 128):
+        self.__free: Deque[ILNPPacket] = deque((ILNPPacket.__new__(ILNPPacket) for _ in range(max_size)), max_size)
+
+    def acquire(self) -> ILNPPacket:
+        try:
+            return self.__free.pop()
+        except IndexError:
+            return ILNPPacket.__new__(ILNPPacket)
+
+    def release(self, packet: ILNPPacket):
+        packet.payload = None
+        packet.datagram = None
+        self.__free.append(packet)
+
+
+class BufferPool:
+    """
+    Bounded pool of equally sized buffers that datagrams are read into, so that reading does not allocate a new
+    buffer each time. Buffers are allocated when the pool runs dry, and dropped on release once it is full.
+    """
+
+    def __init__(self, buffer_size: int, max_size: int = 256):
+        self.buffer_size: int = buffer_size
+        self.__free: Deque[bytearray] = deque((bytearray(buffer_size) for _ in range(max_size)), max_size)
+
+    def acquire(self) -> bytearray:
+        try:
+            return self.__free.pop()
+        except IndexError:
+            return bytearray(self.buffer_size)
+
+    def release(self, buffer: bytearray):
+        self.__free.append(buffer)
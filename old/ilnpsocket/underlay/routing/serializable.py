@@ -5,6 +5,7 @@ class Serializable(abc.ABC):
     """
     Interface for classes that can be serialized to bytes
     """
+    __slots__ = ()
 
     @abc.abstractmethod
     def __bytes__(self):
@@ -14,6 +15,17 @@ class Serializable(abc.ABC):
     def size_bytes(self):
         pass
 
+    def write_into(self, buffer, offset: int) -> int:
+        """
+        Writes the serialized form into the buffer
+        :param buffer: buffer with room for the serialized form after the offset
+        :param offset: position in the buffer to begin writing at
+        :return: offset of the end of the serialized form
+        """
+        end = offset + self.size_bytes()
+        buffer[offset:end] = bytes(self)
+        return end
+
     @classmethod
     @abc.abstractmethod
     def from_bytes(cls, raw_bytes: memoryview):
@@ -1,6 +1,56 @@
+import ctypes
+import ctypes.util
+import functools
 import logging
+import os
 import struct
 import socket
+from typing import List, Tuple
+
+from ilnpsocket.underlay.sockets.sendingsocket import IOVec, MMsgHdr
+
+
+def load_recvmmsg():
+    """Provides the libc recvmmsg function if this platform has one, otherwise None"""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        recvmmsg = libc.recvmmsg
+    except (OSError, AttributeError, TypeError):
+        logging.debug("recvmmsg unavailable, falling back to one recvfrom per datagram")
+        return None
+
+    recvmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(MMsgHdr), ctypes.c_uint, ctypes.c_int, ctypes.c_void_p]
+    recvmmsg.restype = ctypes.c_int
+    return recvmmsg
+
+
+RECVMMSG = load_recvmmsg()
+
+MULTICAST_REQUEST_STRUCT: struct.Struct = struct.Struct("16s15s")
+MULTICAST_REQUEST_PADDING: bytes = bytes(16)
+
+
+def point_iov_at(iov: IOVec, buffer: bytearray):
+    """Makes the iov read into the given buffer, which must not be resized while the iov points at it"""
+    iov.iov_base = ctypes.addressof((ctypes.c_char * len(buffer)).from_buffer(buffer))
+    iov.iov_len = len(buffer)
+
+
+def build_receive_messages(buffers: List[bytearray]) -> Tuple[ctypes.Array, ctypes.Array]:
+    """
+    Builds message headers for recvmmsg, each reading into its own buffer
+    :param buffers: buffers to read into, whose sizes are the largest datagrams that can be read
+    :return: message headers, and the iovs they point at which must be kept alongside them
+    """
+    n_messages = len(buffers)
+    iovs = (IOVec * n_messages)()
+    messages = (MMsgHdr * n_messages)()
+    for idx, buffer in enumerate(buffers):
+        point_iov_at(iovs[idx], buffer)
+        messages[idx].msg_hdr.msg_iov = ctypes.pointer(iovs[idx])
+        messages[idx].msg_hdr.msg_iovlen = 1
+
+    return messages, iovs
 
 
 class ListeningSocket:
@@ -34,11 +84,28 @@ class ListeningSocket:
 
         return self.__sock.recvfrom_into(buffer, buffer_size)
 
+    def recvmmsg(self, messages: ctypes.Array, n_messages: int) -> int:
+        """
+        Reads up to the given number of waiting datagrams in a single call, into the buffers the messages point at
+        :param messages: message headers built by build_receive_messages
+        :param n_messages: maximum number of datagrams to read
+        :return: number of datagrams read, with the length of each in its message's msg_len
+        :raises BlockingIOError: if no datagrams are waiting
+        """
+        n_read = RECVMMSG(self.__sock.fileno(), messages, n_messages, socket.MSG_DONTWAIT, None)
+        if n_read < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+
+        return n_read
+
     def close(self):
         self.__sock.close()
 
 
+@functools.lru_cache(maxsize=1)
 def get_interface_index():
+    """Finds the index of the first known interface present, resolving it only once for every socket"""
     known_names = ["enp4s0", "enp2s0"]
     for idx, name in enumerate(known_names):
         try:
@@ -51,6 +118,13 @@ def get_interface_index():
                 raise err
 
 
+@functools.lru_cache()
+def build_multicast_request(multicast_address: str) -> bytes:
+    """Builds the request for joining the multicast group, once for each address joined"""
+    return MULTICAST_REQUEST_STRUCT.pack(socket.inet_pton(socket.AF_INET6, multicast_address),
+                                         MULTICAST_REQUEST_PADDING)
+
+
 def create_listening_socket(port: int, multicast_address: str) -> socket.socket:
     """
     Creates a UDP datagram socket bound to listen for traffic from the given
@@ -74,8 +148,10 @@ def create_listening_socket(port: int, multicast_address: str) -> socket.socket:
     sock.bind((multicast_address, port, 0, interface_index))
 
     # Construct message for joining multicast group
-    multicast_request = struct.pack("16s15s".encode('utf-8'), socket.inet_pton(socket.AF_INET6, multicast_address),
-                                    (chr(0) * 16).encode('utf-8'))
+    multicast_request = build_multicast_request(multicast_address)
     sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_JOIN_GROUP, multicast_request)
 
+    # Read only once ready, and until empty, so reads never block the thread serving the other interfaces
+    sock.setblocking(False)
+
     return sock
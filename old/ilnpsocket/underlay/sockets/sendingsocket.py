@@ -1,30 +1,191 @@
+import ctypes
+import ctypes.util
+import errno
 import socket
 import logging
-from typing import Dict
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+
+class IOVec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p),
+                ("iov_len", ctypes.c_size_t)]
+
+
+class SockAddrIn6(ctypes.Structure):
+    _fields_ = [("sin6_family", ctypes.c_ushort),
+                ("sin6_port", ctypes.c_uint16),
+                ("sin6_flowinfo", ctypes.c_uint32),
+                ("sin6_addr", ctypes.c_ubyte * 16),
+                ("sin6_scope_id", ctypes.c_uint32)]
+
+
+class MsgHdr(ctypes.Structure):
+    _fields_ = [("msg_name", ctypes.c_void_p),
+                ("msg_namelen", ctypes.c_uint32),
+                ("msg_iov", ctypes.POINTER(IOVec)),
+                ("msg_iovlen", ctypes.c_size_t),
+                ("msg_control", ctypes.c_void_p),
+                ("msg_controllen", ctypes.c_size_t),
+                ("msg_flags", ctypes.c_int)]
+
+
+class MMsgHdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", MsgHdr),
+                ("msg_len", ctypes.c_uint)]
+
+
+def load_sendmmsg():
+    """Provides the libc sendmmsg function if this platform has one, otherwise None"""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        sendmmsg = libc.sendmmsg
+    except (OSError, AttributeError, TypeError):
+        logging.debug("sendmmsg unavailable, falling back to one sendto per destination")
+        return None
+
+    sendmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(MMsgHdr), ctypes.c_uint, ctypes.c_int]
+    sendmmsg.restype = ctypes.c_int
+    return sendmmsg
+
+
+SENDMMSG = load_sendmmsg()
+
+
+def build_sockaddr(ipv6_addr: str, port: int) -> SockAddrIn6:
+    sockaddr = SockAddrIn6()
+    sockaddr.sin6_family = socket.AF_INET6
+    sockaddr.sin6_port = socket.htons(port)
+    ctypes.memmove(sockaddr.sin6_addr, socket.inet_pton(socket.AF_INET6, ipv6_addr), 16)
+    return sockaddr
 
 
 class SendingSocket:
+    MAX_CACHED_DESTINATION_SETS = 64
+
     def __init__(self, port_number: int, locator_to_ipv6: Dict[int, str], loopback: bool):
         self.__port: int = port_number
         self.__sock: socket.socket = create_sending_socket(loopback)
         self.__locator_to_ipv6: Dict[int, str] = locator_to_ipv6
+        # Destination addresses for sendto, built once rather than for every datagram sent
+        self.__locator_to_address: Dict[int, Tuple[str, int]] = {
+            locator: (ipv6_addr, port_number) for locator, ipv6_addr in locator_to_ipv6.items()
+        }
+        self.__locator_to_sockaddr: Dict[int, SockAddrIn6] = {
+            locator: build_sockaddr(ipv6_addr, port_number) for locator, ipv6_addr in locator_to_ipv6.items()
+        }
+        # Message headers built for each set of destinations, kept per thread as the shared iov is rewritten per send
+        self.__thread_state: threading.local = threading.local()
+        # Cleared if the kernel turns out not to implement sendmmsg, despite libc providing it
+        self.__sendmmsg = SENDMMSG
+        self.debug: bool = logging.getLogger().isEnabledFor(logging.DEBUG)
 
     def translate_locator_to_ipv6(self, locator: int) -> str:
         return self.__locator_to_ipv6[locator]
 
-    def sendTo(self, packet_bytes: bytes, next_hop_locator: int):
+    def sendTo(self, packet_bytes: Union[bytes, memoryview], next_hop_locator: int):
         """
         Sends the bytes to the IPv6 destination address
-        :param packet_bytes: byte array to send
+        :param packet_bytes: byte array, or view of a send buffer, to send
         :param next_hop_locator: locator to send packet bytes
         :return: number of bytes sent
         """
         try:
-            ipv6_addr = self.translate_locator_to_ipv6(next_hop_locator)
-            logging.debug("Sending '%s' to %s (%s)", packet_bytes, next_hop_locator, ipv6_addr)
-            return self.__sock.sendto(packet_bytes, (ipv6_addr, self.__port))
+            address = self.__locator_to_address[next_hop_locator]
         except KeyError:
-            logging.error("Unable to send to locator {}".format(next_hop_locator))
+            logging.error("Unable to send to locator %s", next_hop_locator)
+            return None
+
+        if self.debug:
+            logging.debug("Sending '%s' to %s (%s)", bytes(packet_bytes), next_hop_locator, address[0])
+        return self.__sock.sendto(packet_bytes, address)
+
+    def sendMany(self, packet_bytes: Union[bytes, memoryview], next_hop_locators: Iterable[int]) -> int:
+        """
+        Sends the same bytes to each of the given locators, using a single sendmmsg call where available
+        :param packet_bytes: byte array, or view of a send buffer, to send
+        :param next_hop_locators: locators to send packet bytes to
+        :return: number of messages sent
+        """
+        next_hop_locators = tuple(next_hop_locators)
+        if self.__sendmmsg is None or len(next_hop_locators) <= 1:
+            return self.__send_each(packet_bytes, next_hop_locators)
+
+        cached = self.__get_messages(next_hop_locators)
+        if cached is None:
+            return 0
+
+        messages, iov = cached
+        if self.debug:
+            logging.debug("Sending %d bytes to %d locators in one call", len(packet_bytes), len(messages))
+        if isinstance(packet_bytes, memoryview) and not packet_bytes.readonly:
+            data = (ctypes.c_char * len(packet_bytes)).from_buffer(packet_bytes)
+        else:
+            data = ctypes.create_string_buffer(bytes(packet_bytes), len(packet_bytes))
+
+        # Every message shares the one payload, only the destination differs
+        iov.iov_base = ctypes.addressof(data)
+        iov.iov_len = len(packet_bytes)
+
+        n_sent = self.__sendmmsg(self.__sock.fileno(), messages, len(messages), 0)
+        if n_sent < 0:
+            error = ctypes.get_errno()
+            if error != errno.ENOSYS:
+                raise OSError(error, "sendmmsg failed: {}".format(error))
+
+            logging.debug("sendmmsg not supported by kernel, falling back to one sendto per destination")
+            self.__sendmmsg = None
+            return self.__send_each(packet_bytes, next_hop_locators)
+        elif n_sent < len(messages):
+            logging.error("Only sent to %d of %d locators", n_sent, len(messages))
+
+        return n_sent
+
+    def __send_each(self, packet_bytes: Union[bytes, memoryview], next_hop_locators: Tuple[int, ...]) -> int:
+        send_to = self.sendTo
+        n_sent = 0
+        for locator in next_hop_locators:
+            # Locators without a known address are skipped by sendTo, so are not counted
+            if send_to(packet_bytes, locator) is not None:
+                n_sent += 1
+        return n_sent
+
+    def __get_messages(self, next_hop_locators: Tuple[int, ...]) -> Optional[Tuple[ctypes.Array, IOVec]]:
+        """
+        Provides message headers addressed to each of the locators, all pointing at a single iov for the payload.
+        Headers are built once per set of locators, so a repeated flood only has to point the iov at its bytes.
+        """
+        try:
+            cache: Dict[Tuple[int, ...], Tuple[ctypes.Array, IOVec]] = self.__thread_state.messages
+        except AttributeError:
+            cache = self.__thread_state.messages = {}
+
+        cached = cache.get(next_hop_locators)
+        if cached is not None:
+            return cached
+
+        sockaddrs: List[SockAddrIn6] = []
+        for locator in next_hop_locators:
+            try:
+                sockaddrs.append(self.__locator_to_sockaddr[locator])
+            except KeyError:
+                logging.error("Unable to send to locator %s", locator)
+
+        if not sockaddrs:
+            return None
+
+        iov = IOVec()
+        messages = (MMsgHdr * len(sockaddrs))()
+        for message, sockaddr in zip(messages, sockaddrs):
+            message.msg_hdr.msg_name = ctypes.addressof(sockaddr)
+            message.msg_hdr.msg_namelen = ctypes.sizeof(sockaddr)
+            message.msg_hdr.msg_iov = ctypes.pointer(iov)
+            message.msg_hdr.msg_iovlen = 1
+
+        if len(cache) >= self.MAX_CACHED_DESTINATION_SETS:
+            cache.clear()
+        cache[next_hop_locators] = (messages, iov)
+        return messages, iov
 
     def getsockname(self):
         return self.__sock.getsockname()
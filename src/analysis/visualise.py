@@ -1,31 +1,25 @@
-import copy
-
 import pandas as pd
 import argparse
 import numpy as np
 import matplotlib.pyplot as plt
 
 
-def get_snapshot_index(time_value, snapshot_start_times):
-    for idx in range(len(snapshot_start_times) - 1, 0, -1):
-        if time_value >= snapshot_start_times[idx]:
-            return idx
-
-    return 0
+def get_snapshot_indices(time_values, snapshot_start_times):
+    """Finds the index of the last snapshot starting at or before each time, or the first for earlier times"""
+    indices = np.searchsorted(snapshot_start_times, time_values, side="right") - 1
+    return indices.clip(0, len(snapshot_start_times) - 1)
 
 
 def plot_heatmap(grouped_by_node, name):
     n_cols = 7
     n_rows = 7
-    layout = [[0 for col in range(0, n_cols)] for row in range(0, n_rows)]
 
-    snapshots = [copy.deepcopy(layout) for x in range(n_snapshots)]
+    snapshots = np.zeros((n_snapshots, n_rows, n_cols), dtype=np.int64)
 
     for node_id, group in grouped_by_node:
-        for idx, row in group.iterrows():
-            snapshot_index = get_snapshot_index(row.sent_at_time, bins)
-            map_row, map_col = index_dict[node_id]
-            snapshots[snapshot_index][map_row][map_col] = snapshots[snapshot_index][map_row][map_col] + 1
+        snapshot_indices = get_snapshot_indices(group["sent_at_time"].to_numpy(), bins)
+        map_row, map_col = index_dict[node_id]
+        np.add.at(snapshots[:, map_row, map_col], snapshot_indices, 1)
 
     for idx, snapshot in enumerate(snapshots):
         if idx == len(bins) - 1:
@@ -40,8 +34,8 @@ def plot_heatmap(grouped_by_node, name):
         fig.colorbar(im)
 
         # Label with node ID and number of packets sent
-        for i in range(len(layout)):
-            for j in range(len(layout)):
+        for i in range(n_rows):
+            for j in range(n_cols):
                 if (i, j) in index_dict.values():
                     id = {id for id, coords in index_dict.items() if coords == (i, j)}.pop()
                     text = ax.text(j, i, "ID {}".format(id), ha="center", va="center", color="w")
@@ -9,6 +9,7 @@ import time
 from typing import List
 
 from sensor.network.router.serializable import Serializable
+from sensor.packetmonitor import WRITE_BUFFER_SIZE
 
 logger = logging.getLogger(__name__)
 
@@ -66,7 +67,8 @@ class MockDataGenerator:
 
 class SensorReading(Serializable):
     FORMAT = "!QfBHB"
-    SIZE = struct.calcsize(FORMAT)
+    STRUCT = struct.Struct(FORMAT)
+    SIZE = STRUCT.size
 
     def __init__(self, origin_id, temperature_kelvin, humidity_percentage, pressure_hpa, luminosity):
         self.origin_id = origin_id
@@ -79,12 +81,11 @@ class SensorReading(Serializable):
         return str(vars(self))
 
     def __bytes__(self):
-        return struct.pack(self.FORMAT, self.origin_id, self.temperature, self.humidity, self.pressure,
-                           self.luminosity)
+        return self.STRUCT.pack(self.origin_id, self.temperature, self.humidity, self.pressure, self.luminosity)
 
     @classmethod
     def from_bytes(cls, payload):
-        (origin_id, temperature, humidity, pressure, luminosity) = struct.unpack(cls.FORMAT, payload)
+        (origin_id, temperature, humidity, pressure, luminosity) = cls.STRUCT.unpack(payload)
         return SensorReading(origin_id, temperature, humidity, pressure, luminosity)
 
     def size_bytes(self):
@@ -102,7 +103,7 @@ class SinkLog:
         self.readings.append(sensor_reading)
 
     def save(self):
-        with open(self.sink_save_file, "a+") as csv_file:
+        with open(self.sink_save_file, "a+", buffering=WRITE_BUFFER_SIZE) as csv_file:
             logger.debug("Attempting to gain sink log file lock")
             while True:
                 # Loop to gain lock
@@ -117,15 +118,15 @@ class SinkLog:
                         time.sleep(0.1)
 
             writer = csv.writer(csv_file, delimiter=',')
-            if os.path.getsize(self.sink_save_file) is 0:
+            if os.path.getsize(self.sink_save_file) == 0:
                 writer.writerow(["origin_id", "temperature", "humidity", "pressure", "luminosity"])
 
-            writer = csv.writer(csv_file, delimiter=',')
-            for sensor_reading in self.readings:
-                writer.writerow([sensor_reading.origin_id, sensor_reading.temperature, sensor_reading.humidity,
-                                 sensor_reading.pressure, sensor_reading.luminosity])
+            writer.writerows([(reading.origin_id, reading.temperature, reading.humidity, reading.pressure,
+                               reading.luminosity) for reading in self.readings])
 
             writer.writerow([time.time()])
+            # Flush under the lock, or another node's readings could land between these rows
+            csv_file.flush()
 
             # Unlock
             logger.debug("Unlocking file")
@@ -31,33 +31,46 @@ def parse_type(raw_bytes: memoryview) -> int:
 
 
 class NeighbourLinks:
-    """Tracks all link local neighbours and the time since their last keepalive"""
+    """
+    Tracks all link local neighbours and the time since their last keepalive.
+    Rather than aging every neighbour each interval, the interval count is kept once and each neighbour records the
+    interval it was last heard from in.
+    """
 
     def __init__(self):
-        self.neighbour_link_ages: Dict[int, int] = {}
+        self.epoch: int = 0
+        self.neighbour_last_seen: Dict[int, int] = {}
 
     def __contains__(self, item):
-        return item in self.neighbour_link_ages
+        return item in self.neighbour_last_seen
 
     def get_neighbour_age(self, node_id: int) -> int:
-        return self.neighbour_link_ages[node_id]
+        return (self.epoch - self.neighbour_last_seen[node_id]) * KEEP_ALIVE_INTERVAL_SECS
 
     def add_neighbour(self, neighbour_id: int):
-        self.neighbour_link_ages[neighbour_id] = 0
+        self.neighbour_last_seen[neighbour_id] = self.epoch
 
     def refresh_neighbour(self, neighbour_id: int):
         self.add_neighbour(neighbour_id)
 
     def pop_expired_neighbours(self) -> List[int]:
-        expired_ids = [node_id for node_id, age in self.neighbour_link_ages.items() if age >= MAX_AGE_OF_LINK]
-        for expired_id in expired_ids:
-            del self.neighbour_link_ages[expired_id]
+        """Removes and provides the neighbours that haven't sent a keepalive in time, in a single pass"""
+        epoch = self.epoch
+        live: Dict[int, int] = {}
+        expired_ids: List[int] = []
+        for node_id, last_seen in self.neighbour_last_seen.items():
+            if (epoch - last_seen) * KEEP_ALIVE_INTERVAL_SECS >= MAX_AGE_OF_LINK:
+                expired_ids.append(node_id)
+            else:
+                live[node_id] = last_seen
+
+        if expired_ids:
+            self.neighbour_last_seen = live
 
         return expired_ids
 
     def age_neighbours(self):
-        for neighbour in self.neighbour_link_ages:
-            self.neighbour_link_ages[neighbour] += KEEP_ALIVE_INTERVAL_SECS
+        self.epoch += 1
 
 
 class RouterControlPlane(threading.Thread):
@@ -132,10 +145,10 @@ class RouterControlPlane(threading.Thread):
         """Broadcasts hello message containing this nodes current lambda"""
         keepalive = Hello(self.__calc_my_lambda())
         header = ControlHeader(keepalive.TYPE, keepalive.size_bytes())
-        control_message = ControlMessage(header, keepalive)
+        control_message = bytes(ControlMessage(header, keepalive))
 
         packet = ILNPPacket(self.my_address, ALL_LINK_LOCAL_NODES_ADDRESS, hop_limit=0,
-                            payload_length=control_message.size_bytes(), payload=bytes(control_message))
+                            payload_length=len(control_message), payload=control_message)
 
         self.net_interface.broadcast(bytes(packet))
         self.monitor.record_sent_packet(True, False)
@@ -211,9 +224,9 @@ class RouterControlPlane(threading.Thread):
         logger.info("Broadcasting my LSDB")
         lsdb = self.network_graph.to_lsdb_message(next(self.lsb_sequence_generator))
         header = ControlHeader(LSDBMessage.TYPE, lsdb.size_bytes())
-        control_message = ControlMessage(header, lsdb)
+        control_message = bytes(ControlMessage(header, lsdb))
         packet = ILNPPacket(self.my_address, ALL_LINK_LOCAL_NODES_ADDRESS,
-                            payload_length=control_message.size_bytes(), payload=control_message)
+                            payload_length=len(control_message), payload=control_message)
 
         self.net_interface.broadcast(bytes(packet))
         self.monitor.record_sent_packet(True, False)
@@ -256,9 +269,9 @@ class RouterControlPlane(threading.Thread):
 
         expired_message = ExpiredLinkList(expired)
         header = ControlHeader(expired_message.TYPE, expired_message.size_bytes())
-        control_message = ControlMessage(header, expired_message)
+        control_message = bytes(ControlMessage(header, expired_message))
         packet = ILNPPacket(self.my_address, ALL_LINK_LOCAL_NODES_ADDRESS,
-                            payload_length=control_message.size_bytes(), payload=control_message)
+                            payload_length=len(control_message), payload=control_message)
 
         self.net_interface.broadcast(bytes(packet))
         self.monitor.record_sent_packet(True, False)
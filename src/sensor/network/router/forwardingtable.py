@@ -335,17 +335,11 @@ class ForwardingTable:
 
     def find_next_hop_for_local_node(self, dest_id) -> Optional[int]:
         """Finds the next hop to the node with the given id"""
-        if dest_id in self.next_hop_internal:
-            return self.next_hop_internal[dest_id]
-        else:
-            return None
+        return self.next_hop_internal.get(dest_id)
 
     def find_next_hop_for_locator(self, dest_loc: int) -> Optional[int]:
         """Finds the next hop to reach the given locator"""
-        if dest_loc in self.next_hop_to_locator:
-            return self.next_hop_to_locator[dest_loc]
-        else:
-            return None
+        return self.next_hop_to_locator.get(dest_loc)
 
     def add_internal_entry(self, dest_id: int, next_hop: int):
         """Adds or replaces the next hop to reach the given id"""
@@ -361,10 +355,7 @@ class ForwardingTable:
         self.locator_cache[node_id] = node_locator
 
     def get_locator_for_id(self, node_id) -> Optional[int]:
-        if node_id in self.locator_cache:
-            return self.locator_cache[node_id]
-        else:
-            return None
+        return self.locator_cache.get(node_id)
 
     def clear(self):
         self.next_hop_internal.clear()
@@ -6,6 +6,8 @@ from sensor.network.router.serializable import Serializable
 
 
 class ILNPAddress:
+    __slots__ = ('loc', 'id')
+
     def __init__(self, locator: Optional[int], identifier: int):
         self.loc: int = locator
         self.id: int = identifier
@@ -21,7 +23,11 @@ ALL_LINK_LOCAL_NODES_ADDRESS = ILNPAddress(int("ff01000000000000", 16), int("1",
 class ILNPPacket(Serializable):
     MAX_PAYLOAD_SIZE: int = 65535
     ILNPv6_HEADER_FORMAT: str = "!IHBB4Q"
-    HEADER_SIZE: int = struct.calcsize(ILNPv6_HEADER_FORMAT)
+    HEADER_STRUCT: struct.Struct = struct.Struct(ILNPv6_HEADER_FORMAT)
+    HEADER_SIZE: int = HEADER_STRUCT.size
+
+    __slots__ = ('version', 'traffic_class', 'flow_label', 'payload_length', 'next_header', 'hop_limit', 'src', 'dest',
+                 'payload')
 
     def __init__(self, src: ILNPAddress, dest: ILNPAddress, next_header: int = 0,
                  hop_limit: int = 32, version: int = 6, traffic_class: int = 0,
@@ -48,44 +54,50 @@ class ILNPPacket(Serializable):
     def __str__(self):
         barrier = ("-" * 21) + "\n"
         row_format = "{:>15}|{:<15}\n"
-        field_dic = vars(self)
         view = "\n" + barrier
-        for name, value in field_dic.items():
-            view += row_format.format(name, str(value))
+        for name in self.__slots__:
+            view += row_format.format(name, str(getattr(self, name)))
 
         view += barrier
         return view
 
     @classmethod
     def from_bytes(cls, packet_bytes: bytearray) -> 'ILNPPacket':
-        values = struct.unpack(cls.ILNPv6_HEADER_FORMAT, packet_bytes[:cls.HEADER_SIZE])
-
-        flow_label: int = values[0] & 1048575
-        traffic_class: int = (values[0] >> 20 & 255)
-        version: int = values[0] >> 28
-        payload_length: int = values[1]
-        next_header: int = values[2]
-        hop_limit: int = values[3]
-        src: ILNPAddress = ILNPAddress(values[4], values[5])
-        dest: ILNPAddress = ILNPAddress(values[6], values[7])
+        return cls.from_bytes_into(packet_bytes, cls.__new__(cls))
 
-        payload = bytes(packet_bytes[cls.HEADER_SIZE:cls.HEADER_SIZE + payload_length])
-
-        return ILNPPacket(src, dest, next_header, hop_limit, version, traffic_class, flow_label, payload_length,
-                          payload)
+    @classmethod
+    def from_bytes_into(cls, packet_bytes: bytearray, packet: 'ILNPPacket') -> 'ILNPPacket':
+        """
+        Populates an existing packet instance from the given bytes, so packet objects can be reused
+        :param packet_bytes: bytes containing ILNPPacket data
+        :param packet: packet instance to overwrite every field of
+        :return: the given packet instance
+        """
+        values = cls.HEADER_STRUCT.unpack_from(packet_bytes)
+
+        packet.flow_label = values[0] & 1048575
+        packet.traffic_class = (values[0] >> 20 & 255)
+        packet.version = values[0] >> 28
+        packet.payload_length = payload_length = values[1]
+        packet.next_header = values[2]
+        packet.hop_limit = values[3]
+        packet.src = ILNPAddress(values[4], values[5])
+        packet.dest = ILNPAddress(values[6], values[7])
+
+        packet.payload = bytes(packet_bytes[cls.HEADER_SIZE:cls.HEADER_SIZE + payload_length])
+        return packet
 
     def decrement_hop_limit(self) -> None:
         self.hop_limit -= 1
 
     def __bytes__(self) -> bytes:
         first_octet = self.flow_label | (self.traffic_class << 20) | (self.version << 28)
-        header_bytes = struct.pack(self.ILNPv6_HEADER_FORMAT,
-                                   first_octet,
-                                   self.payload_length, self.next_header, self.hop_limit,
-                                   self.src.loc, self.src.id,
-                                   self.dest.loc, self.dest.id)
-
-        return header_bytes + bytes(self.payload)
+        header_bytes = self.HEADER_STRUCT.pack(first_octet,
+                                               self.payload_length, self.next_header, self.hop_limit,
+                                               self.src.loc, self.src.id,
+                                               self.dest.loc, self.dest.id)
+        payload = self.payload if isinstance(self.payload, (bytes, bytearray, memoryview)) else bytes(self.payload)
+        return header_bytes + payload
 
     def size_bytes(self):
         return self.HEADER_SIZE + self.payload_length
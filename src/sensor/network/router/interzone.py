@@ -334,8 +334,8 @@ class ExternalRequestHandler:
 
         request_list: LocatorHopList = packet.payload.body.locator_hop_list
         path: List[int] = request_list.locator_hops
-        if path[len(path) - 1] is not self.my_address.loc:
-            self.net_interface.send(bytes(packet), self.forwarding_table.find_next_hop_for_locator(path[len(path) - 1]))
+        if path[-1] != self.my_address.loc:
+            self.net_interface.send(bytes(packet), self.forwarding_table.find_next_hop_for_locator(path[-1]))
             self.monitor.record_sent_packet(True, True)
         else:
             # Get all neighbour locators not already in path and not the original source
@@ -347,7 +347,7 @@ class ExternalRequestHandler:
                 for locator in unvisited_neighbours:
                     logger.info("Forwarding to {}".format(locator))
                     # Change last hop locator on each iteration
-                    request_list.locator_hops[len(request_list.locator_hops) - 1] = locator
+                    request_list.locator_hops[-1] = locator
                     self.net_interface.send(bytes(packet), self.forwarding_table.find_next_hop_for_locator(locator))
                     self.monitor.record_sent_packet(True, True)
 
@@ -392,7 +392,7 @@ class ExternalRequestHandler:
         if reply.original_destination_id in self.current_requests:
             # Cache path
             hop_list = reply.route_list.locator_hops
-            destination_locator = hop_list[len(hop_list) - 1]
+            destination_locator = hop_list[-1]
             self.path_cache.record_path(destination_locator, hop_list)
 
             # Register locator for id in forwarding table for future requests
@@ -413,7 +413,7 @@ class ExternalRequestHandler:
         else:
             logger.info("Reply too late or already handled. Checking if path is better")
             hop_list = reply.route_list.locator_hops
-            destination_locator = hop_list[len(hop_list) - 1]
+            destination_locator = hop_list[-1]
             self.path_cache.record_path(destination_locator, hop_list)
             # If path is better, main path will have changed
             new_main_path: List[int] = self.path_cache.get_path_to_dest(destination_locator)
@@ -59,6 +59,8 @@ class NetworkInterface:
         self.port = config.port
         self.sock = create_mcast_socket(config.port, self.ipv6_groups, config.loopback)
         self.buffer_size: int = config.packet_buffer_size_bytes
+        self.buffer: bytearray = bytearray(self.buffer_size)
+        self.buffer_view: memoryview = memoryview(self.buffer)
         self.closed = False
 
     def handle_battery_failure(self):
@@ -125,11 +127,11 @@ class NetworkInterface:
             if len(ready) == 0:
                 return None
 
-            buffer = bytearray(self.buffer_size)
-            n_bytes_read, addr_info = self.sock.recvfrom_into(buffer, len(buffer))
+            n_bytes_read, addr_info = self.sock.recvfrom_into(self.buffer, self.buffer_size)
             src_ipv6_addr = addr_info[0]
 
-            return buffer[:n_bytes_read], src_ipv6_addr
+            # Buffer is reused for the next datagram, so only the bytes read are copied out
+            return bytearray(self.buffer_view[:n_bytes_read]), src_ipv6_addr
         except ValueError:
             logger.info("Nothing left to read from socket")
             self.close()
@@ -5,6 +5,7 @@ class Serializable(abc.ABC):
     """
     Interface for classes that can be serialized to bytes
     """
+    __slots__ = ()
 
     @abc.abstractmethod
     def __bytes__(self):
@@ -4,23 +4,14 @@ import fcntl
 import logging
 import os
 import time
+from typing import List, Tuple
 
+# Record of sent or forwarded packet for analysis, kept as the row it is saved as rather than an object per packet:
+# (id of node being recorded, epoch time packet was sent, type of packet (control or data), was packet forwarded)
+PacketEntry = Tuple[int, float, str, bool]
 
-class PacketEntry:
-    """Record of a sent packet"""
-
-    def __init__(self, my_id: int, sent_at_time, packet_type: str, forwarded: bool):
-        """
-        Record of sent or forwarded packet for analysis
-        :param my_id id of node being recorded
-        :param sent_at_time: epoch time packet was sent
-        :param packet_type: type of packet (control or data)
-        :param forwarded: was packet sent or forwarded by this node
-        """
-        self.node_id = my_id
-        self.sent_at_time = sent_at_time
-        self.packet_type = packet_type
-        self.forwarded = forwarded
+# Larger than the default buffer, to cut down the number of write calls a save makes
+WRITE_BUFFER_SIZE = 1 << 20
 
 
 class Monitor:
@@ -28,18 +19,18 @@ class Monitor:
 
     def __init__(self, node_id: int, save_file_loc: str):
         self.node_id = node_id
-        self.entries = []
+        self.entries: List[PacketEntry] = []
         self.save_file = save_file_loc
         self.running = True
 
     def record_sent_packet(self, is_control_message: bool, forwarded=True):
         if is_control_message:
-            self.entries.append(PacketEntry(self.node_id, time.time(), "control", forwarded))
+            self.entries.append((self.node_id, time.time(), "control", forwarded))
         else:
-            self.entries.append(PacketEntry(self.node_id, time.time(), "data", forwarded))
+            self.entries.append((self.node_id, time.time(), "data", forwarded))
 
     def save(self):
-        with open(self.save_file, "a+") as csv_file:
+        with open(self.save_file, "a+", buffering=WRITE_BUFFER_SIZE) as csv_file:
             logging.debug("Attempting to gain log file lock")
             while True:
                 # Loop to gain lock
@@ -54,11 +45,12 @@ class Monitor:
                         time.sleep(0.1)
 
             writer = csv.writer(csv_file, delimiter=',')
-            if os.path.getsize(self.save_file) is 0:
+            if os.path.getsize(self.save_file) == 0:
                 writer.writerow(["node_id", "sent_at_time", "packet_type", "forwarded"])
 
-            for entry in self.entries:
-                writer.writerow([entry.node_id, entry.sent_at_time, entry.packet_type, entry.forwarded])
+            writer.writerows(self.entries)
+            # Must reach the file before the lock is released
+            csv_file.flush()
 
             # Unlock
             logging.debug("Unlocking file")